@@ -0,0 +1,154 @@
+# File: bench.py
+
+import os
+import json
+import time
+import datetime
+import embedding_utils
+from registry import get_config, use_database
+from embedding_utils import EMBED_STATS, set_backend, cache_summary
+from esic_loader import load_esic, collection as esic_collection
+from isic_loader import load_isic
+from mapper import map_esic_to_isic, get_base_index, clear_index_cache, result_collection, isic_lookup, expand_results
+from result_export import export_collection, FORMATS
+from sheet_reader import open_rows
+from logger import banner, done
+from utils import safe_str
+
+RECALL_KS = (1, 3, 5, 10)
+# The bench reloads and re-stamps its collections, so it never runs against the configured database
+BENCH_DB  = os.getenv("BENCH_DB", get_config().get("bench", {}).get("database", "industry_mapping_bench"))
+
+# ─── Gold Mapping ────────────────────────────────────────────
+def read_gold(filepath):
+    """{esic_code: {acceptable ISIC codes}} from an .xlsx/.csv with ESIC Code / ISIC Code columns.
+
+    Several rows per ESIC code mean several acceptable answers; without those headers
+    the first two columns are used.
+    """
+    header, _, rows = open_rows(filepath)
+    names = [h.lower().replace(" ", "_") for h in header]
+    esic_idx = names.index("esic_code") if "esic_code" in names else 0
+    isic_idx = names.index("isic_code") if "isic_code" in names else 1
+    gold = {}
+    for row in rows:
+        esic, isic = safe_str(row[esic_idx]), safe_str(row[isic_idx])
+        if esic and isic:
+            gold.setdefault(esic, set()).add(isic)
+    return gold
+
+# ─── Accuracy ────────────────────────────────────────────────
+def match_rank(matches, expected, lookup):
+    """1-based rank of the first match whose full_code or short code is in `expected`, else None."""
+    for rank, match in enumerate(matches, 1):
+        codes = {match.get("full_code"), safe_str(lookup.get(match.get("full_code"), {}).get("code"))}
+        if codes & expected:
+            return rank
+    return None
+
+def accuracy_report(results, gold, lookup, ks=RECALL_KS):
+    """recall@k, MRR and the readme's N.th Match histogram over the gold ESIC codes."""
+    ranks = [match_rank(results.get(code, []), expected, lookup) for code, expected in gold.items()]
+    total = max(1, len(ranks))
+    histogram = {str(n): sum(1 for r in ranks if r == n) for n in range(1, 6)}
+    histogram["6 or more"] = sum(1 for r in ranks if r and r >= 6)
+    histogram["not found"] = sum(1 for r in ranks if r is None)
+    report = {
+        "evaluated": len(ranks),
+        "unmapped": sum(1 for code in gold if code not in results),
+    }
+    report.update({f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / total, 4) for k in ks})
+    report["mrr"] = round(sum(1.0 / r for r in ranks if r) / total, 4)
+    report["nth_match"] = histogram
+    return report
+
+# ─── Benchmark Run ───────────────────────────────────────────
+def run_bench(gold_path, esic_path="data/esic_data.xlsx", isic_path="data/isic_data_r5.xlsx",
+              model="mxbai-embed-large", match_mode="cosine", k=10, backend=None, out=None, fmt="xlsx"):
+    """Reload both sheets, map and export while timing each stage; scores against the gold file.
+
+    Everything runs in BENCH_DB (own collections, fingerprints and snapshot subtree), and fake
+    vectors are stored under "fake-<model>", so the configured data is never touched.
+    """
+    if backend:
+        set_backend(backend)
+    if embedding_utils.BACKEND == "fake":
+        model = f"fake-{model}"
+    previous_db = use_database(BENCH_DB)
+    clear_index_cache()
+    try:
+        return _run_bench(gold_path, esic_path, isic_path, model, match_mode, k, out, fmt)
+    finally:
+        use_database(previous_db)
+        clear_index_cache()
+
+def _run_bench(gold_path, esic_path, isic_path, model, match_mode, k, out, fmt):
+    banner(f"🏁 Benchmark: {model} / {match_mode} / k={k} / backend={embedding_utils.BACKEND} / db={BENCH_DB}")
+    stages = {}
+
+    embed_before = dict(EMBED_STATS)
+    started = time.time()
+    esic_collection.delete_many({})
+    isic_rows = load_isic(isic_path, [model])
+    esic_rows = load_esic(esic_path, [model])
+    embed_seconds = EMBED_STATS["seconds"] - embed_before["seconds"]
+    embed_texts = EMBED_STATS["texts"] - embed_before["texts"]
+    stages["embed"] = embed_seconds
+    stages["ingest"] = time.time() - started - embed_seconds
+
+    started = time.time()
+    clear_index_cache()
+    get_base_index(model, match_mode)
+    stages["index_build"] = time.time() - started
+
+    started = time.time()
+    results = map_esic_to_isic(store=True, match_mode=match_mode, model=model, k_top=k)
+    stages["map"] = time.time() - started
+
+    lookup = isic_lookup()
+    started = time.time()
+    export_path = os.path.join("output", f"bench_results{FORMATS[fmt]}")
+    export_collection(result_collection(model, match_mode), export_path, k, fmt,
+                      transform=lambda batch: expand_results(batch, lookup))
+    stages["export"] = time.time() - started
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "model": model,
+        "match_mode": match_mode,
+        "backend": embedding_utils.BACKEND,
+        "database": BENCH_DB,
+        "k": k,
+        "gold": gold_path,
+        "esic_rows": esic_rows,
+        "isic_rows": isic_rows,
+        "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+        "throughput": {
+            "embed_texts_per_s": round(embed_texts / max(embed_seconds, 1e-9), 1),
+            "map_entries_per_s": round(len(results) / max(stages["map"], 1e-9), 1),
+        },
+        "accuracy": accuracy_report(results, read_gold(gold_path), lookup),
+        "cache": cache_summary(),
+    }
+
+    out = out or os.path.join("output", f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    done(f"Benchmark written to {out}")
+    return report
+
+def print_report(report):
+    accuracy = report["accuracy"]
+    print(f"\n{'stage':<14}{'seconds':>10}")
+    for name, seconds in report["stages"].items():
+        print(f"{name:<14}{seconds:>10.3f}")
+    print(f"\n{'metric':<14}{'value':>10}")
+    for name in [f"recall@{k}" for k in RECALL_KS] + ["mrr"]:
+        print(f"{name:<14}{accuracy[name]:>10.3f}")
+    print(f"\n    N.th Match              Count of ESIC Code")
+    for nth, count in accuracy["nth_match"].items():
+        print(f"        {nth:<20}{count}")
+    print(f"    Grand Total             {accuracy['evaluated']}")
@@ -0,0 +1,84 @@
+# File: delta_sync.py
+
+import hashlib
+from pymongo import ReplaceOne, UpdateOne
+
+# ─── Row Content Hash ────────────────────────────────────────
+def content_hash(*texts):
+    """sha256 of the text(s) a row embeds; unchanged hash means reusable vectors."""
+    return hashlib.sha256("\x1f".join(t or "" for t in texts).encode("utf-8")).hexdigest()
+
+def plain_fields(record):
+    """Record fields other than vectors, norms and bookkeeping."""
+    return {
+        k: v for k, v in record.items()
+        if not k.startswith(("vec_", "norms_", "embedding_")) and k not in ("_id", "content_hash", "embedded_models")
+    }
+
+# ─── Delta Planning ──────────────────────────────────────────
+def plan_delta(collection, records, key_field, models, chunk=False):
+    """Compare sheet records with stored documents by key.
+
+    Returns row indices that are added, changed (text differs or a model is missing, so
+    they need embedding), relabelled (only non-embedded fields differ) or skipped, plus
+    the stored keys that no longer appear in the sheet. With `chunk=True` only the
+    records' own keys are read and nothing is reported removed; call remove_unseen once
+    the whole sheet has been streamed.
+    """
+    fields = {key_field: 1, "content_hash": 1, "embedded_models": 1}
+    fields.update({k: 1 for r in records[:1] for k in plain_fields(r)})
+    query = {key_field: {"$in": [r.get(key_field) for r in records]}} if chunk else {}
+    existing = {doc.get(key_field): doc for doc in collection.find(query, fields)}
+
+    plan = {"added": [], "changed": [], "relabelled": [], "skipped": [], "removed": []}
+    keys = set()
+    for idx, record in enumerate(records):
+        key = record.get(key_field)
+        keys.add(key)
+        doc = existing.get(key)
+        if doc is None:
+            plan["added"].append(idx)
+        elif doc.get("content_hash") != record["content_hash"] or not set(models) <= set(doc.get("embedded_models") or []):
+            plan["changed"].append(idx)
+        elif any(doc.get(k) != v for k, v in plain_fields(record).items()):
+            plan["relabelled"].append(idx)
+        else:
+            plan["skipped"].append(idx)
+    plan["removed"] = [key for key in existing if key not in keys]
+    return plan
+
+def apply_delta(collection, records, plan, key_field, batch_size=500):
+    """Upsert added/changed rows in full, $set labels on relabelled rows, delete removed keys."""
+    ops = [
+        ReplaceOne({key_field: records[i][key_field]}, records[i], upsert=True)
+        for i in plan["added"] + plan["changed"]
+    ]
+    ops += [
+        UpdateOne({key_field: records[i][key_field]}, {"$set": plain_fields(records[i])})
+        for i in plan["relabelled"]
+    ]
+    for start in range(0, len(ops), batch_size):
+        collection.bulk_write(ops[start:start + batch_size], ordered=False)
+    if plan["removed"]:
+        collection.delete_many({key_field: {"$in": plan["removed"]}})
+
+def remove_unseen(collection, key_field, keys):
+    """Delete stored documents whose key did not appear in the streamed sheet."""
+    keys = set(keys)
+    removed = [doc.get(key_field) for doc in collection.find({}, {key_field: 1}) if doc.get(key_field) not in keys]
+    if removed:
+        collection.delete_many({key_field: {"$in": removed}})
+    return removed
+
+def merge_plan(total, plan):
+    """Accumulate a chunk's plan into running totals (only the list lengths are meaningful)."""
+    for key, items in plan.items():
+        total.setdefault(key, []).extend(items)
+    return total
+
+def delta_summary(plan):
+    return (
+        f"{len(plan['added'])} added, {len(plan['changed'])} changed, "
+        f"{len(plan['relabelled'])} relabelled, {len(plan['removed'])} removed, "
+        f"{len(plan['skipped'])} skipped"
+    )
@@ -0,0 +1,207 @@
+# File: embedding_cache.py
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from registry import get_config
+
+# ─── Load Config ─────────────────────────────────────────────
+config = get_config()
+
+cache_config = config.get("embedding_cache", {})
+CACHE_ENABLED = os.getenv("EMBED_CACHE", str(cache_config.get("enabled", True))).lower() == "true"
+CACHE_PATH    = os.getenv("EMBED_CACHE_PATH", cache_config.get("path", "cache/embeddings.sqlite"))
+MAX_ENTRIES   = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", cache_config.get("max_entries", 200000)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model     TEXT    NOT NULL,
+    text_hash TEXT    NOT NULL,
+    dim       INTEGER NOT NULL,
+    vector    BLOB    NOT NULL,
+    last_used REAL    NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+"""
+
+def text_hash(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ─── Content-Addressed Vector Cache ──────────────────────────
+class EmbeddingCache:
+    """SQLite store of raw float32 vectors keyed by (model, sha256(text)), LRU-capped."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def get(self, model, text):
+        key = text_hash(text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", (model, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                (time.time(), model, key),
+            )
+            self._conn.commit()
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def get_many(self, model, texts):
+        """{text: vector} for the cached subset of texts, in a single transaction."""
+        keys = {text_hash(text): text for text in texts}
+        found = {}
+        with self._lock:
+            hashes = list(keys)
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, blob in self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    (model, *chunk),
+                ):
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, text_hash(text)) for text in found],
+            )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, model, text, vec):
+        blob = np.asarray(vec, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                (model, text_hash(text), len(vec), blob, time.time()),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self.max_entries and self._writes % 1000 == 0:
+                self._prune_locked(self.max_entries)
+
+    def put_many(self, model, vectors):
+        """Store {text: vector} in a single transaction."""
+        now = time.time()
+        rows = [
+            (model, text_hash(text), len(vec), np.asarray(vec, dtype=np.float32).tobytes(), now)
+            for text, vec in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            before = self._writes
+            self._writes += len(rows)
+            if self.max_entries and self._writes // 1000 != before // 1000:
+                self._prune_locked(self.max_entries)
+
+    def _prune_locked(self, max_entries):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - max_entries
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        return excess
+
+    def prune(self, max_entries=None):
+        """Evict least-recently-used entries beyond max_entries; returns how many were removed."""
+        with self._lock:
+            return self._prune_locked(self.max_entries if max_entries is None else max_entries)
+
+    def clear(self, model=None):
+        with self._lock:
+            if model:
+                removed = self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,)).rowcount
+            else:
+                removed = self._conn.execute("DELETE FROM embeddings").rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, COUNT(*), SUM(LENGTH(vector)) FROM embeddings GROUP BY model"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "max_entries": self.max_entries,
+            "models": {model: {"entries": n, "bytes": size or 0} for model, n, size in rows},
+            "entries": sum(n for _, n, _ in rows),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+# ─── Shared Instance ─────────────────────────────────────────
+_cache = None
+
+def get_cache():
+    """Process-wide cache, or None when disabled via config/EMBED_CACHE."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+# ─── CLI ─────────────────────────────────────────────────────
+def show_help():
+    print("""
+🧪 Usage: python embedding_cache.py <command>
+
+Commands:
+  stats            → Show entries and size per model
+  prune [N]        → Evict least-recently-used entries beyond N (default: max_entries)
+  clear [model]    → Remove all entries, or only those of one model
+""")
+
+def run_cli(args):
+    if not args or args[0] in ["--help", "-h"]:
+        show_help()
+        return
+    cache = EmbeddingCache()
+    cmd = args[0].lower()
+    if cmd == "stats":
+        stats = cache.stats()
+        print(f"📦 {stats['path']} — {stats['entries']} entries (cap {stats['max_entries']})")
+        for model, info in stats["models"].items():
+            print(f"   {model}: {info['entries']} vectors, {info['bytes'] / 1e6:.1f} MB")
+    elif cmd == "prune":
+        removed = cache.prune(int(args[1]) if len(args) > 1 else None)
+        print(f"🧹 Pruned {removed} cached embeddings.")
+    elif cmd == "clear":
+        removed = cache.clear(args[1] if len(args) > 1 else None)
+        print(f"🧹 Cleared {removed} cached embeddings.")
+    else:
+        print(f"❌ Unknown command: {cmd}")
+        show_help()
+
+if __name__ == "__main__":
+    run_cli(sys.argv[1:])
@@ -1,25 +1,39 @@
 # File: embedding_utils.py
 
 import os
-import yaml
-import requests
+import time
 import numpy as np
-from dotenv import load_dotenv
+from registry import get_config, get_session
+from embedding_cache import get_cache
+from logger import progress
+from request_executor import RequestExecutor
+from fake_embedding import fake_embeddings
+from metrics import METRICS
 
 # ─── Load Config and Defaults ───────────────────────────
-load_dotenv()
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+config = get_config()
 
 OLLAMA_HOST      = os.getenv("OLLAMA_HOST", config.get("ollama_host", "http://localhost:11434"))
 DEFAULT_MODEL    = os.getenv("EMBEDDING_MODEL", config.get("embedding_model", "nomic-embed-text"))
 DEFAULT_DIM      = config["embedding"].get("dimension", 768)
 DEFAULT_NORMMODE = os.getenv("NORMALIZE_MODE", config["embedding"].get("normalization_mode", "cosine"))
 VERBOSE          = os.getenv("EMBED_VERBOSE", "false").lower() == "true"
-
-# ─── HTTP Session for Connection Reuse ──────────────────
-session = requests.Session()
-session.headers.update({"Connection": "keep-alive"})
+BATCH_SIZE       = int(os.getenv("EMBED_BATCH_SIZE", config["embedding"].get("batch_size", 32)))
+BATCH_TIMEOUT    = int(os.getenv("EMBED_TIMEOUT", config["embedding"].get("timeout", 60)))
+CONCURRENCY      = int(os.getenv("EMBED_CONCURRENCY", config["embedding"].get("concurrency", 1)))
+MAX_RETRIES      = int(os.getenv("EMBED_RETRIES", config["embedding"].get("max_retries", 3)))
+BACKEND          = os.getenv("EMBED_BACKEND", config["embedding"].get("backend", "ollama"))
+# "embed": batched /api/embed, which returns unit-length vectors; "embeddings": one text per
+# /api/embeddings request, which keeps the raw (unnormalized) vectors that distance / dotProduct rank by
+EMBED_API        = os.getenv("EMBED_API", config["embedding"].get("api", "embed"))
+
+# Cumulative time and texts spent in embedding calls (read by the bench command)
+EMBED_STATS = {"seconds": 0.0, "texts": 0}
+
+def set_backend(name):
+    """Switch between "ollama" and the in-process deterministic "fake" backend."""
+    global BACKEND
+    BACKEND = name
 
 # ─── Normalize Embedding Vector ─────────────────────────
 def normalize_vector(vec, mode="cosine"):
@@ -31,66 +45,127 @@ def normalize_vector(vec, mode="cosine"):
         return (vec / norm).tolist() if norm > 0 else vec.tolist()
     return vec.tolist()
 
+# ─── Batched Raw Vector Fetch (cache first, then Ollama) ─
+def _post_embed_batch(texts, model):
+    """One multi-input /api/embed request (or one /api/embeddings request per text); vectors come back in input order."""
+    if BACKEND == "fake":
+        return fake_embeddings(texts, model, DEFAULT_DIM)
+    if EMBED_API == "embeddings":
+        return [_post_raw_embedding(text, model) for text in texts]
+    endpoint = f"{OLLAMA_HOST}/api/embed"
+    response = get_session().post(endpoint, json={"model": model, "input": texts}, timeout=BATCH_TIMEOUT)
+    response.raise_for_status()
+    vecs = response.json().get("embeddings") or []
+    vecs = [[float(v) for v in vec] if vec else None for vec in vecs]
+    return vecs + [None] * (len(texts) - len(vecs))
+
+def _post_raw_embedding(text, model):
+    response = get_session().post(f"{OLLAMA_HOST}/api/embeddings", json={"model": model, "prompt": text}, timeout=BATCH_TIMEOUT)
+    response.raise_for_status()
+    vec = response.json().get("embedding")
+    return [float(v) for v in vec] if vec else None
+
+def cache_model(model):
+    """Cache key for a model's vectors; unit and raw vectors of the same text are kept apart."""
+    return f"{model}@raw" if EMBED_API == "embeddings" else model
+
+def get_raw_embeddings(texts, model: str = None, batch_size: int = None, prefix: str = None, concurrency: int = None):
+    """Raw embeddings for a list of texts, aligned with the input (None where the service failed).
+
+    Texts are de-duplicated, served from the cache where possible, and the rest are
+    sent to Ollama batch_size at a time, up to `concurrency` requests in flight.
+    """
+    model       = model or DEFAULT_MODEL
+    # /api/embeddings takes one text per request, so concurrency (not batching) is the lever there
+    batch_size  = 1 if EMBED_API == "embeddings" and BACKEND != "fake" else max(1, batch_size or BATCH_SIZE)
+    concurrency = concurrency or CONCURRENCY
+    # Fake vectors must never be served to (or from) the real model's cache entries
+    cache       = get_cache() if BACKEND != "fake" else None
+    started     = time.time()
+
+    unique  = list(dict.fromkeys(texts))
+    vectors = cache.get_many(cache_model(model), unique) if cache is not None else {}
+    pending = [text for text in unique if text not in vectors]
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+    def on_done(completed, total):
+        if prefix:
+            progress(completed, total, prefix=prefix)
+
+    executor = RequestExecutor(concurrency=concurrency, retries=MAX_RETRIES)
+    results = executor.map(lambda batch: _post_embed_batch(batch, model), batches, on_done=on_done)
+
+    failed, last_error = 0, None
+    for batch, fetched in zip(batches, results):
+        if isinstance(fetched, Exception):
+            print(f"❌ Embedding batch error: {fetched}") if VERBOSE else None
+            failed, last_error = failed + 1, fetched
+            continue
+        fetched = {text: vec for text, vec in zip(batch, fetched) if vec}
+        vectors.update(fetched)
+        if cache is not None and fetched:
+            cache.put_many(cache_model(model), fetched)
+
+    if prefix and batches:
+        print(f"\n   ▶ {executor.summary()}")
+    if prefix and failed:
+        print(f"   ⚠️ {failed}/{len(batches)} embedding batches failed after retries (last error: {last_error})")
+    elapsed = time.time() - started
+    missing = sum(1 for text in unique if not vectors.get(text))
+    METRICS.observe("embed_seconds", elapsed, model=model)
+    METRICS.inc("embed_texts_total", len(texts), model=model)
+    METRICS.inc("embed_cache_hits_total", len(unique) - len(pending), model=model)
+    if missing:
+        METRICS.inc("embed_missing_total", missing, model=model)
+    EMBED_STATS["seconds"] += elapsed
+    EMBED_STATS["texts"] += len(texts)
+    return [vectors.get(text) for text in texts]
+
+def fetch_raw_embedding(text: str, model: str = None):
+    """Raw embedding as a float list, or None if the service returned nothing."""
+    return get_raw_embeddings([text], model)[0]
+
+def cache_summary():
+    cache = get_cache()
+    if cache is None:
+        return "Embedding cache disabled."
+    return f"Embedding cache: {cache.hits} hits, {cache.misses} misses."
+
 # ─── Embedding with Optional Normalization ──────────────
 def get_embedding(text: str, model: str = None, normalize_mode: str = None):
     model     = model or DEFAULT_MODEL
     norm_mode = normalize_mode or DEFAULT_NORMMODE
-    endpoint  = f"{OLLAMA_HOST}/api/embeddings"
-
-    try:
-        response = session.post(endpoint, json={"model": model, "prompt": text}, timeout=20)
-        response.raise_for_status()
-        data = response.json()
-
-        vec = data.get("embedding")
-        if not vec:
-            print(f"❌ Missing embedding for '{text[:60]}'...") if VERBOSE else None
-            return [0.0] * DEFAULT_DIM
 
-        vec = [float(v) for v in vec]
-        return normalize_vector(vec, norm_mode)
-
-    except Exception as e:
-        print(f"❌ Embedding error: {e}") if VERBOSE else None
+    vec = fetch_raw_embedding(text, model)
+    if not vec:
+        print(f"❌ Missing embedding for '{text[:60]}'...") if VERBOSE else None
         return [0.0] * DEFAULT_DIM
 
-# ─── All Normalization Modes (raw, cosine, dotProduct) ──
-def get_all_embeddings(text: str, model: str = None):
-    model    = model or DEFAULT_MODEL
-    endpoint = f"{OLLAMA_HOST}/api/embeddings"
-
-    # print(text)
-    # print(model)
+    return normalize_vector(vec, norm_mode)
 
-
-    try:
-        response = session.post(endpoint, json={"model": model, "prompt": text}, timeout=20)
-        response.raise_for_status()
-        data = response.json()
-
-        vec = data.get("embedding")
-        if not vec:
-            print(f"❌ Missing embedding vector.") if VERBOSE else None
-            fallback = [0.0] * DEFAULT_DIM
-            return {
-                f"embedding_raw_{model}": fallback,
-                f"embedding_cosine_{model}": fallback,
-                f"embedding_dot_{model}": fallback
-            }
-
-        raw = [float(v) for v in vec]
-        return {
-            f"embedding_raw_{model}": normalize_vector(raw, mode="none"),
-            f"embedding_cosine_{model}": normalize_vector(raw, mode="cosine"),
-            f"embedding_dot_{model}": normalize_vector(raw, mode="dotProduct")
-        }
-
-    except Exception as e:
-        print(f"❌ Embedding batch error: {e}") if VERBOSE else None
+# ─── All Normalization Modes (raw, cosine, dotProduct) ──
+def expand_embedding_modes(raw, model: str = None):
+    model = model or DEFAULT_MODEL
+    if not raw:
         fallback = [0.0] * DEFAULT_DIM
         return {
             f"embedding_raw_{model}": fallback,
             f"embedding_cosine_{model}": fallback,
             f"embedding_dot_{model}": fallback
         }
+    return {
+        f"embedding_raw_{model}": normalize_vector(raw, mode="none"),
+        f"embedding_cosine_{model}": normalize_vector(raw, mode="cosine"),
+        f"embedding_dot_{model}": normalize_vector(raw, mode="dotProduct")
+    }
 
+def get_all_embeddings(text: str, model: str = None):
+    raw = fetch_raw_embedding(text, model)
+    if not raw:
+        print(f"❌ Missing embedding vector.") if VERBOSE else None
+    return expand_embedding_modes(raw, model)
+
+def get_all_embeddings_batch(texts, model: str = None, batch_size: int = None, prefix: str = None, concurrency: int = None):
+    """get_all_embeddings for a list of texts, embedded in bulk."""
+    raws = get_raw_embeddings(texts, model, batch_size, prefix, concurrency)
+    return [expand_embedding_modes(raw, model) for raw in raws]
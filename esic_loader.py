@@ -1,45 +1,44 @@
-# File: isic_loader.py
+# File: esic_loader.py
 
 import os
-import yaml
-import openpyxl
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from embedding_utils import get_all_embeddings
-from logger import banner, progress, done
+from registry import get_config, LazyCollection
+from embedding_utils import get_raw_embeddings
+from vector_store import compact_fields
+from delta_sync import content_hash
+from sheet_reader import open_rows
+from logger import banner, progress
+from ingest import run_load
 from utils import safe_str
 
-load_dotenv()
-
 # ─── Load Config ─────────────────────────────────────────────
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
-client = MongoClient(mongo_uri)
-db = client["industry_mapping"]
+config = get_config()
 
-# Select collection: ISIC Rev. 4 or Rev. 5
+# Select collection: ISIC Rev. 4 or Rev. 5 (connects on first use)
 collection_key = os.getenv("ESIC_COLLECTION", "esic")
-collection = db[config["collections"].get(collection_key, "esic")]
+collection = LazyCollection(collection_key, "esic")
+
+STORE_NORMS = config.get("storage", {}).get("store_norms", True)
+CHUNK_SIZE  = config.get("ingest", {}).get("chunk_size", 500)
 
-# ─── Load ESIC Excel ────────────────────────────────────
-def load_esic(filepath="data/esic_data.xlsx", models=None, store=True):
+# ─── Load ESIC Excel / CSV ───────────────────────────────
+def load_esic(filepath="data/esic_data.xlsx", models=None, store=True, concurrency=None, delta=False, chunk_size=CHUNK_SIZE, resume=False):
     models = models or [
                         # "nomic-embed-text", 
                         "mxbai-embed-large", 
                         # "bge-m3"
                         ]
-    wb = openpyxl.load_workbook(filepath)
-    sheet = wb.active
-    header = [safe_str(cell.value) for cell in sheet[1]]
-    col = {name: idx for idx, name in enumerate(header)}
-    total = sheet.max_row - 1
-    data = []
-    seen = set()
     banner(f"📥 Loading ESIC records from {filepath}")
+    return run_load("ESIC", collection, "code", read_records(filepath), embed_records, filepath, models,
+                    store=store, concurrency=concurrency, delta=delta, chunk_size=chunk_size, resume=resume)
 
-    for idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=1):
+# ─── Stream ESIC Rows ────────────────────────────────────────
+def read_records(filepath):
+    """Yield (record, title) per distinct ESIC code."""
+    seen = set()
+    header, total, rows = open_rows(filepath)
+    col = {name: idx for idx, name in enumerate(header)}
+    for idx, row in enumerate(rows, start=1):
+        progress(idx, total, prefix="▶ ESIC Rows")
         code = safe_str(row[col.get("Code")])
         if not code or code in seen:
             continue
@@ -47,11 +46,6 @@ def load_esic(filepath="data/esic_data.xlsx", models=None, store=True):
 
         title = safe_str(row[col.get("Title of category", 2)])
 
-        # Collect embeddings from all models
-        embeddings = {}
-        for model in models:
-            embeddings.update(get_all_embeddings(title, model))
-
         record = {
             "code": code,
             "title": title,
@@ -61,21 +55,26 @@ def load_esic(filepath="data/esic_data.xlsx", models=None, store=True):
             "major_group": safe_str(row[col.get("Major Group")]),
             "group": safe_str(row[col.get("Group")]),
             "licensing_category": safe_str(row[col.get("Licensing Category")]),
-            **embeddings
+            "content_hash": content_hash(title),
         }
-        data.append(record)
-        progress(idx, total, prefix="▶ ESIC Embedding")
-    if(store):
-     save_to_mongo(data)
-   
-    done(f"Loaded and embedded {len(data)} ESIC records.")
-    return data
+        yield record, title
 
-# ─── Store in MongoDB ────────────────────────────────────────
-def save_to_mongo(records):
-    collection.insert_many(records)
-    done(f"Stored {len(records)} ESIC entries in collection: {collection.name}")
-    
+# ─── Embed Titles ────────────────────────────────────────────
+def embed_records(records, titles, models, concurrency=None):
+    """Embed titles in place with every model; returns the number of texts left without a vector."""
+    # Collect raw embeddings from all models, one bulk request stream per model
+    failed = 0
+    for record in records:
+        record["embedded_models"] = []
+    for model in models:
+        raws = get_raw_embeddings(titles, model, prefix=f"▶ ESIC Embedding ({model})", concurrency=concurrency)
+        failed += sum(1 for raw in raws if raw is None)
+        for record, raw in zip(records, raws):
+            record.update(compact_fields(model, raw, store_norms=STORE_NORMS))
+            # Only models with a stored vector count as embedded, so --delta retries the rest
+            if raw is not None:
+                record["embedded_models"].append(model)
+    return failed
 
 # ─── Script Entry ─────────────────────────────────────────────
 if __name__ == "__main__":
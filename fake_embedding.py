@@ -0,0 +1,32 @@
+# File: fake_embedding.py
+
+import re
+import hashlib
+import numpy as np
+
+# ─── Deterministic Offline Embeddings ────────────────────────
+# Feature-hashed bag of words and character trigrams: texts sharing terms land close
+# together, so benchmarks run without Ollama and still rank sensibly and reproducibly.
+TOKEN = re.compile(r"[a-z0-9]+")
+
+def _features(text):
+    words = TOKEN.findall((text or "").lower())
+    for word in words:
+        yield f"w:{word}", 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield f"c:{padded[i:i + 3]}", 0.3
+
+def fake_embedding(text, model="fake", dim=768):
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text):
+        digest = hashlib.blake2b(f"{model}|{feature}".encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vec[bucket] += sign * weight
+    if not vec.any():
+        vec[0] = 1.0
+    return vec.tolist()
+
+def fake_embeddings(texts, model="fake", dim=768):
+    return [fake_embedding(text, model, dim) for text in texts]
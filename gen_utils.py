@@ -1,20 +1,80 @@
 # File: gen_utils.py
 
 import os
-import yaml
-import requests
 import json
 import time
-from dotenv import load_dotenv
+import sqlite3
+import hashlib
+import threading
+from registry import get_config, get_session
 
 # ─── Load Environment & Config ───────────────────────────
-load_dotenv()
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+config = get_config()
 
+gen_config = config.get("generation", {})
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", config.get("ollama_host", "http://localhost:11434"))
 VERBOSE = os.getenv("GEN_VERBOSE", "false").lower() == "true"
-TIMEOUT = int(os.getenv("GEN_TIMEOUT", "300"))  # Adjustable
+TIMEOUT = int(os.getenv("GEN_TIMEOUT", gen_config.get("timeout", 300)))  # Adjustable
+CACHE_ENABLED = os.getenv("GEN_CACHE", str(gen_config.get("cache", True))).lower() == "true"
+CACHE_PATH = os.getenv("GEN_CACHE_PATH", gen_config.get("cache_path", "cache/generations.sqlite"))
+
+SAMPLING = {
+    "temperature": 0.3,
+    "max_tokens": 1024,
+    "stop": ["\n"]
+}
+
+# ─── Persistent Response Cache ───────────────────────────
+class ResponseCache:
+    """SQLite store of finished generations keyed by (model, sha256(prompt), sampling params)."""
+
+    def __init__(self, path=CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "model TEXT NOT NULL, prompt_hash TEXT NOT NULL, params_hash TEXT NOT NULL, "
+            "response TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (model, prompt_hash, params_hash))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, prompt, params):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return model, prompt_hash, params_hash
+
+    def get(self, model, prompt, params):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM generations WHERE model = ? AND prompt_hash = ? AND params_hash = ?",
+                self.key(model, prompt, params),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, model, prompt, params, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (model, prompt_hash, params_hash, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (*self.key(model, prompt, params), response, time.time()),
+            )
+            self._conn.commit()
+
+_cache = None
+
+def get_cache():
+    global _cache
+    if CACHE_ENABLED and _cache is None:
+        _cache = ResponseCache()
+    return _cache if CACHE_ENABLED else None
 
 # ─── Endpoint Resolver ───────────────────────────────────
 def resolve_endpoint(model_name: str):
@@ -25,46 +85,59 @@ def resolve_endpoint(model_name: str):
 # ─── Host Check (Optional) ───────────────────────────────
 def is_host_reachable(host_url):
     try:
-        return requests.get(host_url, timeout=5).status_code < 400
+        return get_session().get(host_url, timeout=5).status_code < 400
     except:
         return False
 
-# ─── Unified Query Interface ─────────────────────────────
-def query_gen_model(prompt: str, model_name: str, retries: int = 0, delay: int = 2):
-    endpoint, mode = resolve_endpoint(model_name)
+# ─── Streaming Query Interface ───────────────────────────
+def stream_gen_model(prompt: str, model_name: str):
+    """Yield response text as tokens arrive; cached prompts are replayed in one piece.
 
-    payload = {
-        "model": model_name,
-        "temperature": 0.3,
-        "max_tokens": 1024,
-        "stop": ["\n"]
-    }
+    Completed (non-empty) responses are stored in the response cache; raises on HTTP errors.
+    """
+    prompt = prompt.strip()
+    cache = get_cache()
+    cached = cache.get(model_name, prompt, SAMPLING) if cache is not None else None
+    if cached is not None:
+        yield cached
+        return
 
+    endpoint, mode = resolve_endpoint(model_name)
+    payload = {"model": model_name, **SAMPLING, "stream": True}
     if mode == "chat":
-        payload["messages"] = [{"role": "user", "content": prompt.strip()}]
+        payload["messages"] = [{"role": "user", "content": prompt}]
     else:
-        payload.update({
-            "prompt": prompt.strip(),
-            "stream": False
-        })
+        payload["prompt"] = prompt
+
+    start, first, output = time.time(), None, []
+    with get_session().post(endpoint, json=payload, timeout=TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line.decode("utf-8"))
+            token = data.get("message", {}).get("content", "") if mode == "chat" else data.get("response", "")
+            if token:
+                if first is None:
+                    first = time.time() - start
+                output.append(token)
+                yield token
+            if data.get("done"):
+                break
+
+    final = "".join(output).strip()
+    if VERBOSE: print(f"📥 {mode} response: first token {first or 0:.2f}s, total {time.time() - start:.2f}s: {final[:100]}...")
+    if final and cache is not None:
+        cache.put(model_name, prompt, SAMPLING, final)
 
+# ─── Unified Query Interface ─────────────────────────────
+def query_gen_model(prompt: str, model_name: str, retries: int = 0, delay: int = 2):
     for attempt in range(retries + 1):
         try:
-            start = time.time()
-            response = requests.post(endpoint, json=payload, timeout=TIMEOUT)
-            response.raise_for_status()
-
-            # ─── Chat-style ───────────────────────────
-            if mode == "chat":
-                data = response.json()
-                if VERBOSE: print(f"📥 Chat response: {data}")
-                return data.get("message", {}).get("content", "⚠️ No chat output.")
-
-            # ─── Generate-style ────────────────────────
-            data = response.json()
-            final = data.get("response", "") or data.get("output", "")
-            if VERBOSE: print(f"📥 Generate response in {time.time() - start:.2f}s: {final[:100]}...")
-            return final.strip() or "⚠️ Empty generate output."
+            final = "".join(stream_gen_model(prompt, model_name)).strip()
+            if final:
+                return final
+            return "⚠️ No chat output." if resolve_endpoint(model_name)[1] == "chat" else "⚠️ Empty generate output."
 
         except Exception as ex:
             print(f"⚠️ Attempt {attempt+1} failed: {ex}")
@@ -1,6 +1,12 @@
 # File: generative_mapper.py
 
-from gen_utils import query_gen_model
+import time
+import hashlib
+from gen_utils import query_gen_model, stream_gen_model
+from request_executor import RequestExecutor
+from registry import get_collection
+from mapper import result_collection, vector_field, isic_lookup, expand_results
+from logger import banner, progress, done
 
 def build_reasoning_prompt(esic_title: str, matches: list, embedding_model: str, gen_model: str, similarity_mode: str, top_k: int = 3):
     prompt = [f"ESIC Title of Category: {esic_title}", ""]
@@ -32,3 +38,94 @@ def recommend_best_match(esic_title: str, matches: list, embedding_model: str, g
     prompt = build_reasoning_prompt(esic_title, matches, embedding_model, gen_model, similarity_mode, top_k)
     return query_gen_model(prompt, model_name=gen_model)
 
+
+def stream_best_match(esic_title: str, matches: list, embedding_model: str, gen_model: str, similarity_mode: str, top_k: int = 3):
+    """recommend_best_match, yielding the reasoning as it is generated."""
+    prompt = build_reasoning_prompt(esic_title, matches, embedding_model, gen_model, similarity_mode, top_k)
+    return stream_gen_model(prompt, model_name=gen_model)
+
+# ─── Batch Re-Ranking over Stored Results ─────────────────
+PROMPT_FIELDS = [
+    "code", "description", "level", "section", "section_label", "division", "division_label",
+    "group", "group_label", "explanatory_note_inclusion", "explanatory_note_exclusion",
+]
+
+def score_margin(matches):
+    """Top-1 minus top-2 score (inf when there is no runner-up)."""
+    return matches[0]["score"] - matches[1]["score"] if len(matches) > 1 else float("inf")
+
+def recommended_code(answer, matches):
+    """First candidate ISIC full_code mentioned in the answer, if any."""
+    for m in matches:
+        if m.get("full_code") and m["full_code"] in answer:
+            return m["full_code"]
+    return None
+
+def reason_over_results(gen_model, embedding_model="mxbai-embed-large", similarity_mode="cosine", full_text=False,
+                        top_k=5, workers=2, margin=None, limit=None):
+    """LLM adjudication for every stored mapping result, checkpointed per answer.
+
+    Each answer is upserted into reasoning_results<variant> as soon as it arrives; entries
+    already answered for the same prompt are skipped, so an interrupted run resumes where
+    it stopped. With `margin`, only entries whose top-1/top-2 score gap is below it are sent.
+    """
+    result_col = result_collection(embedding_model, similarity_mode, full_text)
+    esic_key = vector_field(embedding_model, similarity_mode, full_text)
+    reason_col = get_collection(f"reasoning{esic_key}", f"reasoning_results{esic_key}")
+    reason_col.create_index([("esic_code", 1), ("gen_model", 1)], unique=True)
+
+    lookup = isic_lookup(PROMPT_FIELDS)
+    answered = {
+        doc["esic_code"]: doc.get("prompt_hash")
+        for doc in reason_col.find({"gen_model": gen_model}, {"esic_code": 1, "prompt_hash": 1})
+    }
+
+    jobs, skipped, resumed = [], 0, 0
+    for record in result_col.find({}, {"_id": 0, "esic_code": 1, "title": 1, "matches": 1}):
+        matches = expand_results([record], lookup)[0]["matches"][:top_k]
+        if not matches or (margin is not None and score_margin(matches) >= margin):
+            skipped += 1
+            continue
+        prompt = build_reasoning_prompt(record.get("title", ""), matches, embedding_model, gen_model, similarity_mode, len(matches))
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        if answered.get(record["esic_code"]) == prompt_hash:
+            resumed += 1
+            continue
+        jobs.append((record, matches, prompt, prompt_hash))
+        if limit and len(jobs) >= limit:
+            break
+
+    banner(f"🧠 Reasoning over {len(jobs)} ESIC entries with {gen_model} ({resumed} already answered, {skipped} skipped by margin)")
+
+    def adjudicate(job):
+        record, matches, prompt, prompt_hash = job
+        started = time.time()
+        # Failures raise (and are retried) instead of being checkpointed as answers
+        answer = "".join(stream_gen_model(prompt, gen_model)).strip()
+        if not answer:
+            raise RuntimeError("empty generation")
+        reason_col.replace_one(
+            {"esic_code": record["esic_code"], "gen_model": gen_model},
+            {
+                "esic_code": record["esic_code"],
+                "title": record.get("title", ""),
+                "gen_model": gen_model,
+                "answer": answer,
+                "recommended_code": recommended_code(answer, matches),
+                "top1_code": matches[0]["full_code"],
+                "margin": round(score_margin(matches), 4) if len(matches) > 1 else None,
+                "prompt_hash": prompt_hash,
+                "seconds": round(time.time() - started, 2),
+                "created_at": time.time(),
+            },
+            upsert=True,
+        )
+        return answer
+
+    # Fixed pool: answer length, not host overload, drives most of the latency spread
+    executor = RequestExecutor(concurrency=workers, retries=2, backoff=2.0, name="generate", adaptive=False)
+    results = executor.map(adjudicate, jobs, on_done=lambda n, total: progress(n, total, prefix="▶ Reasoned"))
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    print()
+    done(f"Reasoned {len(jobs) - failed} entries ({failed} failed, re-run to resume) into {reason_col.name}. {executor.summary()}")
+    return len(jobs) - failed, failed
@@ -0,0 +1,86 @@
+# File: ingest.py
+
+from contextlib import nullcontext
+from embedding_utils import cache_summary
+from snapshot import stamp_collection
+from delta_sync import plan_delta, apply_delta, remove_unseen, merge_plan, delta_summary
+from sheet_reader import chunked
+from metrics import METRICS
+from jobs import Job, file_fingerprint
+from logger import done
+
+# ─── Chunked, Resumable Load ─────────────────────────────────
+def run_load(label, collection, key_field, rows, embed, filepath, models, store=True, concurrency=None,
+             delta=False, chunk_size=500, resume=False, clear=False, finish=None):
+    """Embed and store (record, texts) rows chunk by chunk as a checkpointed "load<label>" job.
+
+    `embed(records, texts, models, concurrency)` fills in the vectors and returns the number of
+    texts left without one. With `delta` only new or re-worded rows are embedded; `clear` empties
+    the collection first on a fresh full load; `finish(collection)` runs after the final stamp.
+    Without `store` the embedded records are returned instead of the row count.
+    """
+    tag = label.lower()
+    job = Job(f"load{tag}", {"file": file_fingerprint(filepath), "collection": collection.name, "models": models,
+                             "chunk_size": chunk_size, "delta": delta}, resume=resume) if store else None
+    if job and job.resumed and not collection.count_documents({}, limit=1):
+        job.restart()    # the collection was cleared since the checkpoints were written
+    if job and job.completed:
+        done(f"{label} load already completed for this file (job {job.id}); nothing to redo.")
+        return job.stored_rows
+    if job and clear and not delta and not job.resumed:
+        collection.delete_many({})
+
+    with job or nullcontext():
+        # Rows are embedded and flushed chunk by chunk, so memory is bounded by chunk_size
+        data, seen, count, plan = [], set(), 0, {}
+        for number, chunk in enumerate(chunked(rows, chunk_size)):
+            records = [record for record, _ in chunk]
+            texts = [text for _, text in chunk]
+            count += len(records)
+            seen.update(record[key_field] for record in records)
+            if job and job.is_done(number):
+                job.skip(len(records))
+                continue
+            if not store:
+                embed(records, texts, models, concurrency)
+                data.extend(records)
+                continue
+
+            if delta:
+                chunk_plan = plan_delta(collection, records, key_field, models, chunk=True)
+                pending = chunk_plan["added"] + chunk_plan["changed"]
+                failed = embed([records[i] for i in pending], [texts[i] for i in pending], models, concurrency)
+                with METRICS.timer("ingest_write_seconds", collection=tag):
+                    apply_delta(collection, records, chunk_plan, key_field)
+                merge_plan(plan, chunk_plan)
+            else:
+                failed = embed(records, texts, models, concurrency)
+                with METRICS.timer("ingest_write_seconds", collection=tag):
+                    if job.resumed:
+                        # A chunk interrupted between insert and checkpoint may be partly stored already
+                        collection.delete_many({key_field: {"$in": [r[key_field] for r in records]}})
+                    # Unordered so one bad document does not abort the rest of the chunk
+                    collection.insert_many(records, ordered=False)
+            METRICS.inc("rows_loaded_total", len(records), collection=tag)
+            job.checkpoint(number, len(records), failed)
+        print()
+
+        if not store:
+            done(f"Loaded and embedded {count} {label} records. {cache_summary()}")
+            return data
+
+        if delta:
+            plan["removed"] = remove_unseen(collection, key_field, seen)
+        stamp_collection(collection)
+        if finish:
+            finish(collection)
+        job.complete()
+        if delta:
+            done(f"Delta-loaded {label}: {delta_summary(plan)}. {cache_summary()}")
+        else:
+            done(f"Stored {count} {label} entries in collection: {collection.name}")
+        job.report()
+
+    if not delta:
+        done(f"Loaded and embedded {count} {label} records. {cache_summary()}")
+    return count
@@ -1,49 +1,46 @@
 # File: isic_loader.py
 
 import os
-import yaml
-import openpyxl
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from embedding_utils import get_all_embeddings
-from logger import banner, progress, done
-from utils import safe_str, subtract_vectors
-
-load_dotenv()
+from registry import get_config, LazyCollection
+from embedding_utils import get_raw_embeddings
+from vector_store import compact_fields
+from delta_sync import content_hash
+from sheet_reader import open_rows
+from logger import banner, progress
+from ingest import run_load
+from utils import safe_str, safe_int
 
 # ─── Load Config ─────────────────────────────────────────────
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
-client = MongoClient(mongo_uri)
-db = client["industry_mapping"]
+config = get_config()
 
-# Select collection: ISIC Rev. 4 or Rev. 5
+# Select collection: ISIC Rev. 4 or Rev. 5 (connects on first use)
 collection_key = os.getenv("ISIC_COLLECTION", "isic")
-collection = db[config["collections"].get(collection_key, "isic")]
+collection = LazyCollection(collection_key, "isic")
 
+STORE_NORMS = config.get("storage", {}).get("store_norms", True)
+CHUNK_SIZE  = config.get("ingest", {}).get("chunk_size", 500)
 
 
 
-def load_isic(filepath="data/isic_data_r5.xlsx", models=None, store=True):
+
+def load_isic(filepath="data/isic_data_r5.xlsx", models=None, store=True, concurrency=None, delta=False, chunk_size=CHUNK_SIZE, resume=False):
     models = models or [
                             # "nomic-embed-text", 
                             "mxbai-embed-large", 
                             # "bge-m3"
         ]
-    
-    collection.delete_many({})
-
-    wb = openpyxl.load_workbook(filepath)
-    sheet = wb.active
-    header = [safe_str(cell.value) for cell in sheet[1]]
-    col = {name: idx for idx, name in enumerate(header)}
-    total = sheet.max_row - 1
-    data = []
     banner(f"📥 Loading ISIC records from {filepath}")
-
-    for idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=1):
+    return run_load("ISIC", collection, "full_code", read_records(filepath), embed_records, filepath, models,
+                    store=store, concurrency=concurrency, delta=delta, chunk_size=chunk_size, resume=resume,
+                    clear=True, finish=write_lexical_index)
+
+# ─── Stream ISIC Rows ────────────────────────────────────────
+def read_records(filepath):
+    """Yield (record, (positive, full, negative) texts) per ISIC row."""
+    header, total, rows = open_rows(filepath)
+    col = {name: idx for idx, name in enumerate(header)}
+    for idx, row in enumerate(rows, start=1):
+        progress(idx, total, prefix="▶ ISIC Rows")
         desc = safe_str(row[col.get("description")])
         code = safe_str(row[col.get("full_code")])
 
@@ -58,28 +55,12 @@ def load_isic(filepath="data/isic_data_r5.xlsx", models=None, store=True):
         # positive_text = f"{desc}.{ f' Includes: {inclusion}' if inclusion else ''}"
         positive_text = f"{desc}"
         # positive_text_full = f"{desc}. \n ISIC context: {section_label}, {division_label}, {group_label} \n { f'Includes: {inclusion}' if inclusion else ''}"
-        positive_text_full = f"{desc}. \n { f'Includes: {inclusion}' if inclusion else ''}"
+        # Without an inclusion note the full text is the description itself, so it shares its embedding
+        positive_text_full = f"{desc}. \n Includes: {inclusion}" if inclusion else desc
         negative_text = exclusion if exclusion else ""
 
-        embeddings = {}
-
-        for model in models:
-            pos_embeds = get_all_embeddings(positive_text, model)
-            pos_embeds_full  = get_all_embeddings(positive_text_full, model)
-            neg_embeds = get_all_embeddings(negative_text, model) if exclusion else {}
-
-            for mode in ["raw", "cosine", "dot"]:
-                key = f"embedding_{mode}_{model}"
-                pos_vec = pos_embeds_full.get(key, [])
-                neg_vec = neg_embeds.get(key, [])
-                adjusted = subtract_vectors(pos_vec, neg_vec) if neg_vec else pos_vec
-                embeddings[f"{key}_full"] = adjusted
-
-                embeddings[key] = pos_embeds.get(key, [])
-                
-
         record = {
-            "sort_order": row[col.get("sort_order")],
+            "sort_order": safe_int(row[col.get("sort_order")]),
             "section": row[col.get("section")],
             "section_label":  section_label,
             "division": row[col.get("division")],
@@ -87,27 +68,41 @@ def load_isic(filepath="data/isic_data_r5.xlsx", models=None, store=True):
             "group": row[col.get("group")],
             "group_label":  group_label ,
             "code": row[col.get("code")],
-            "level": row[col.get("level")],
+            "level": safe_int(row[col.get("level")]),
             "full_code": code,
             "description": desc,
             "explanatory_note_inclusion": inclusion,
             "explanatory_note_exclusion": exclusion,
-            **embeddings
+            "content_hash": content_hash(positive_text, positive_text_full, negative_text),
         }
-        data.append(record)
-        progress(idx, total, prefix="▶ ISIC Embedding")
-
-    if store:
-        save_to_mongo(data)
-
-    done(f"Loaded and embedded {len(data)} ISIC records.")
-    return data
-
-
-# ─── Store in MongoDB ────────────────────────────────────────
-def save_to_mongo(records):
-    collection.insert_many(records)
-    done(f"Stored {len(records)} ISIC entries in collection: {collection.name}")
+        yield record, (positive_text, positive_text_full, negative_text)
+
+# ─── Embed Short / Full / Exclusion Texts ────────────────────
+def embed_records(records, texts, models, concurrency=None):
+    """Embed each row's texts in place with every model; returns the number of texts left without a vector."""
+    failed = 0
+    for record in records:
+        record["embedded_models"] = []
+    for model in models:
+        # One de-duplicated bulk request stream covering short, full and exclusion texts
+        flat = [text for triple in texts for text in triple if text]
+        by_text = dict(zip(flat, get_raw_embeddings(flat, model, prefix=f"▶ ISIC Embedding ({model})", concurrency=concurrency)))
+        failed += sum(1 for text in set(flat) if by_text.get(text) is None)
+
+        for record, (positive_text, positive_text_full, negative_text) in zip(records, texts):
+            raw_full = by_text.get(positive_text_full) if positive_text_full != positive_text else None
+            raw_neg = by_text.get(negative_text) if negative_text else None
+            record.update(compact_fields(model, by_text.get(positive_text), raw_full, raw_neg, store_norms=STORE_NORMS))
+            # A model counts as embedded only once all of the row's texts have a vector
+            if all(by_text.get(text) is not None for text in (positive_text, positive_text_full, negative_text) if text):
+                record["embedded_models"].append(model)
+    return failed
+
+# ─── Lexical Index ───────────────────────────────────────────
+def write_lexical_index(collection):
+    # sklearn is only imported when a load actually writes the TF-IDF index
+    from lexical_index import write_lexical_index as write_index
+    return write_index(collection)
 
 # ─── Script Entry ─────────────────────────────────────────────
 if __name__ == "__main__":
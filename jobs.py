@@ -0,0 +1,118 @@
+# File: jobs.py
+
+import json
+import time
+import hashlib
+from registry import LazyCollection
+from logger import done
+
+jobs_col = LazyCollection("jobs", "jobs")
+
+# ─── Job Identity ────────────────────────────────────────────
+def file_fingerprint(filepath):
+    """sha256 of the input file, so a resumed job never mixes chunks of two different sheets."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def job_id(name, params):
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return f"{name}:{hashlib.sha256(blob.encode('utf-8')).hexdigest()[:12]}"
+
+# ─── Checkpointed Job ────────────────────────────────────────
+class Job:
+    """One run of a pipeline step, with a checkpoint marker per finished chunk in the jobs collection.
+
+    A chunk is marked only after its rows are written (and embedded without failures), so
+    `resume=True` can skip every marked chunk and an interruption costs at most the chunks
+    that were in progress. Same name + params (input file hash, models, chunk size...) = same job.
+    """
+
+    def __init__(self, name, params, resume=False):
+        self.name = name
+        self.id = job_id(name, params)
+        self.reused_chunks = self.reused_rows = 0
+        self.written_chunks = self.written_rows = 0
+        self.failed_chunks = 0
+        previous = jobs_col.find_one({"_id": self.id}) if resume else None
+
+        self.resumed = bool(previous)
+        self.completed = bool(previous) and previous.get("status") == "completed"
+        self.done_chunks = set(previous.get("chunks", [])) if previous else set()
+        self.stored_rows = previous.get("rows", 0) if previous else 0
+        self.params = params
+        if previous:
+            jobs_col.update_one({"_id": self.id}, {
+                "$set": {"status": "completed" if self.completed else "running", "resumed_at": time.time()},
+                "$inc": {"resumes": 1},
+            })
+        else:
+            self.restart()
+
+    def restart(self):
+        """Forget all checkpoints (e.g. the target collection was cleared since the last run)."""
+        self.resumed = self.completed = False
+        self.done_chunks, self.stored_rows = set(), 0
+        jobs_col.replace_one({"_id": self.id}, {
+            "_id": self.id, "name": self.name, "params": self.params, "status": "running",
+            "chunks": [], "rows": 0, "resumes": 0, "started_at": time.time(), "updated_at": time.time(),
+        }, upsert=True)
+
+    def is_done(self, chunk):
+        return chunk in self.done_chunks
+
+    def skip(self, rows, chunks=1):
+        self.reused_chunks += chunks
+        self.reused_rows += rows
+
+    def checkpoint(self, chunk, rows, failed=0):
+        """Record a written chunk; chunks with failed embeddings stay unmarked and are redone on resume."""
+        self.written_chunks += 1
+        self.written_rows += rows
+        if failed:
+            self.failed_chunks += 1
+            jobs_col.update_one({"_id": self.id}, {"$set": {"updated_at": time.time()}, "$inc": {"failed_rows": failed}})
+            return
+        self.done_chunks.add(chunk)
+        jobs_col.update_one({"_id": self.id}, {
+            "$addToSet": {"chunks": chunk},
+            "$inc": {"rows": rows},
+            "$set": {"updated_at": time.time()},
+        })
+
+    def complete(self):
+        status = "completed" if not self.failed_chunks else "incomplete"
+        jobs_col.update_one({"_id": self.id}, {"$set": {"status": status, "finished_at": time.time()}})
+
+    def fail(self, error):
+        jobs_col.update_one({"_id": self.id}, {"$set": {"status": "failed", "error": str(error), "updated_at": time.time()}})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(exc)
+            print(f"\n❌ Job {self.id} stopped after {len(self.done_chunks)} checkpointed chunks; re-run with --resume")
+        return False
+
+    def summary(self):
+        parts = [f"{self.written_chunks} chunks ({self.written_rows} rows) processed"]
+        if self.resumed:
+            parts.append(f"{self.reused_chunks} chunks ({self.reused_rows} rows) reused from checkpoints")
+        if self.failed_chunks:
+            parts.append(f"{self.failed_chunks} chunks with failed embeddings left for --resume")
+        return f"Job {self.id}: " + ", ".join(parts)
+
+    def report(self):
+        done(self.summary())
+
+# ─── Job Listing ─────────────────────────────────────────────
+def list_jobs(limit=20):
+    print(f"{'job':<28}{'status':<12}{'chunks':>7}{'rows':>8}{'resumes':>9}  updated")
+    for job in jobs_col.find({}).sort("updated_at", -1).limit(limit):
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job.get("updated_at", 0)))
+        print(f"{job['_id']:<28}{job.get('status', '?'):<12}{len(job.get('chunks', [])):>7}"
+              f"{job.get('rows', 0):>8}{job.get('resumes', 0):>9}  {updated}")
@@ -0,0 +1,111 @@
+# File: lexical_index.py
+
+import os
+import pickle
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from vector_index import META_FIELDS, top_k_rows
+from snapshot import snapshot_dir, get_fingerprint
+
+TEXT_FIELDS = ["description", "explanatory_note_inclusion"]
+
+# ─── Sparse TF-IDF Index over ISIC Text ──────────────────────
+class LexicalIndex:
+    """TF-IDF (word uni/bigram, sublinear tf, l2 rows) over ISIC description + inclusion note.
+
+    Scores are cosine similarities in [0, 1]; needs no embedding service.
+    """
+
+    def __init__(self, vectorizer, matrix, meta):
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.meta = meta
+        self._partitions = {}
+
+    def __len__(self):
+        return len(self.meta)
+
+    @classmethod
+    def from_documents(cls, docs):
+        meta, texts = [], []
+        for doc in docs:
+            meta.append({f: doc.get(f) for f in META_FIELDS})
+            texts.append(" ".join(str(doc.get(f) or "") for f in TEXT_FIELDS))
+        vectorizer = TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2), stop_words="english")
+        if not any(t.strip() for t in texts):
+            return cls(vectorizer, sparse.csr_matrix((len(meta), 0), dtype=np.float32), meta)
+        return cls(vectorizer, vectorizer.fit_transform(texts).astype(np.float32), meta)
+
+    @classmethod
+    def from_collection(cls, collection):
+        fields = {f: 1 for f in META_FIELDS + TEXT_FIELDS}
+        return cls.from_documents(collection.find({}, fields))
+
+    # ── Row Selection ────────────────────────────────────────────
+    def subset(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        return LexicalIndex(self.vectorizer, self.matrix[rows], [self.meta[i] for i in rows])
+
+    def partition(self, level=None, section=None):
+        key = (level, section)
+        if key not in self._partitions:
+            self._partitions[key] = self.subset([
+                i for i, m in enumerate(self.meta)
+                if (level is None or m.get("level") == level) and (section is None or m.get("section_label") == section)
+            ])
+        return self._partitions[key]
+
+    def aligned(self, meta):
+        """Rows reordered to match another index's meta by full_code (missing codes score 0)."""
+        position = {m.get("full_code"): i for i, m in enumerate(self.meta)}
+        pairs = [(out, position[m.get("full_code")]) for out, m in enumerate(meta) if m.get("full_code") in position]
+        out_rows, src_rows = zip(*pairs) if pairs else ((), ())
+        select = sparse.csr_matrix((np.ones(len(pairs), dtype=np.float32), (out_rows, src_rows)), shape=(len(meta), len(self)))
+        return LexicalIndex(self.vectorizer, select @ self.matrix, list(meta))
+
+    # ── Scoring ──────────────────────────────────────────────────
+    def score_block(self, texts):
+        """Dense (len(texts) x len(self)) block of TF-IDF cosine scores."""
+        if len(self) == 0 or self.matrix.shape[1] == 0:
+            return np.zeros((len(texts), len(self)), dtype=np.float32)
+        Q = self.vectorizer.transform(texts)
+        return np.asarray((Q @ self.matrix.T).todense(), dtype=np.float32)
+
+    def format_matches(self, row_idx, row_scores):
+        return [{**self.meta[i], "score": round(float(s), 3)} for i, s in zip(row_idx, row_scores)]
+
+    def search_batch(self, texts, k=3, chunk_size=256):
+        results = []
+        chunk_size = max(1, int(chunk_size or len(texts) or 1))
+        for start in range(0, len(texts), chunk_size):
+            idx, top = top_k_rows(self.score_block(texts[start:start + chunk_size]), k)
+            results.extend(self.format_matches(i, s) for i, s in zip(idx, top))
+        return results
+
+    def search(self, text, k=3):
+        return self.search_batch([text], k)[0]
+
+# ─── Persistence (built at ISIC load time) ───────────────────
+def lexical_path(collection_name):
+    return os.path.join(snapshot_dir(collection_name), "lexical.pkl")
+
+def write_lexical_index(collection):
+    """Build the TF-IDF index from the collection and pickle it next to the vector snapshots."""
+    index = LexicalIndex.from_collection(collection)
+    path = lexical_path(collection.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump({"fingerprint": get_fingerprint(collection), "index": index}, f)
+    return index
+
+def load_lexical_index(collection, fingerprint=None):
+    """Pickled index when it matches `fingerprint`, else None."""
+    path = lexical_path(collection.name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        saved = pickle.load(f)
+    if fingerprint is not None and saved.get("fingerprint") != fingerprint:
+        return None
+    return saved["index"]
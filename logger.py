@@ -1,14 +1,43 @@
 # logger.py
 import sys
+import time
 import datetime
 
+# Start (time, count) of each running progress line, keyed by prefix
+_progress_start = {}
+
 def banner(message):
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"{now} 🔹 {message}")
 
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
 def progress(current, total, prefix="Progress"):
-    msg = f"{prefix}: {current}/{total}"
-    print(f"\r{msg}", end="")
+    """Overwrite one status line with current/total, the rate since the first call, and an ETA."""
+    now = time.time()
+    start = _progress_start.get(prefix)
+    if start is None or current < start[1]:
+        start = _progress_start[prefix] = (now, current)
+    elapsed, advanced = now - start[0], current - start[1]
+
+    msg = f"{prefix}: {current}/{total if total is not None else '?'}"
+    if elapsed > 0 and advanced > 0:
+        rate = advanced / elapsed
+        msg += f" ({rate:.1f}/s"
+        if total and current < total:
+            msg += f", ETA {format_duration((total - current) / rate)}"
+        elif total and current >= total:
+            msg += f", {format_duration(elapsed)}"
+        msg += ")"
+    if total is not None and current >= total:
+        _progress_start.pop(prefix, None)
+    print(f"\r{msg}   ", end="")
     sys.stdout.flush()
 
 def done(message):
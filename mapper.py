@@ -1,31 +1,49 @@
 # File: vector_mapper.py
 
 import os
-import yaml
+import json
+import time
+import hashlib
 import numpy as np
-from dotenv import load_dotenv
-from pymongo import MongoClient
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy.spatial.distance import euclidean
+from pymongo import ReplaceOne
 
 from logger import progress
+from registry import get_config, get_collection, LazyCollection
+from metrics import METRICS, timed
+from jobs import Job
+from vector_index import VectorIndex, META_FIELDS, recall_at_k, top_k_rows
+from vector_store import derive_vector, projection
+from snapshot import get_fingerprint, load_snapshot
 
 # ─── Setup ────────────────────────────────────────────────────────
-load_dotenv()
+config = get_config()
 
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
-client = MongoClient(mongo_uri)
-db = client["industry_mapping"]
-
-esic_col = db[config["collections"]["esic"]]
-isic_col = db[config["collections"]["isic"]]
+esic_col = LazyCollection("esic")
+isic_col = LazyCollection("isic")
 
 
 K_TOP = int(os.getenv("MATCH_K_TOP", config["search"].get("k_top", 3)))
 SIM_MODE = os.getenv("MATCH_MODE", config["embedding"].get("normalization_mode", "cosine"))
+CHUNK_SIZE = int(os.getenv("MATCH_CHUNK_SIZE", config["search"].get("chunk_size", 256)))
+WRITE_BATCH = int(config["search"].get("write_batch", 1000))
+SNAPSHOT_CHECK_INTERVAL = float(config.get("snapshot", {}).get("check_interval", 60))
+
+compressed_config = config["search"].get("compressed", {})
+COMPRESSED  = os.getenv("MATCH_COMPRESSED", str(compressed_config.get("enabled", False))).lower() == "true"
+COMPRESS_METHOD   = compressed_config.get("method", "truncate")
+COMPRESS_DIMS     = compressed_config.get("dims")
+COMPRESS_QUANTIZE = compressed_config.get("quantize", True)
+OVERSAMPLE  = float(compressed_config.get("oversample", 4))
+
+hierarchy_config = config["search"].get("hierarchy", {})
+BEAM_WIDTH  = int(os.getenv("MATCH_BEAM", hierarchy_config.get("beam", 3)))
+START_LEVEL = int(hierarchy_config.get("start_level", 1))
+
+lexical_config = config["search"].get("lexical", {})
+RETRIEVAL   = os.getenv("MATCH_RETRIEVAL", lexical_config.get("retrieval", "dense"))
+LEXICAL_WEIGHT    = float(lexical_config.get("weight", 0.3))
+LEXICAL_SHORTLIST = int(lexical_config.get("shortlist", 50))
+RETRIEVAL_MODES   = ["dense", "lexical", "rerank", "fusion"]
 
 # ─── Scoring Algorithm ────────────────────────────────────────────
 def compute_score(vec1, vec2, mode=SIM_MODE):
@@ -33,10 +51,12 @@ def compute_score(vec1, vec2, mode=SIM_MODE):
         return 0.0
     try:
         if mode == "cosine":
+            from sklearn.metrics.pairwise import cosine_similarity
             return float(cosine_similarity([vec1], [vec2])[0][0])
         elif mode == "dotProduct":
             return float(np.dot(vec1, vec2))
         elif mode == "distance":
+            from scipy.spatial.distance import euclidean
             dist = euclidean(vec1, vec2)
             return 1.0 / (1.0 + dist)
         else:
@@ -46,96 +66,377 @@ def compute_score(vec1, vec2, mode=SIM_MODE):
         print(f"❌ Score computation failed: {e}")
         return 0.0
 
-# ─── Matching Logic ───────────────────────────────────────────────
-def find_best_matches(esic_vec, k=K_TOP, match_mode=SIM_MODE, model=None, full_text=False, isic_level=None, section=None):
-    isic_key = {
+# ─── Resident ISIC Index ──────────────────────────────────────────
+_base_cache = {}
+
+def vector_field(model, match_mode=SIM_MODE, full_text=False):
+    return {
         "cosine": f"embedding_cosine_{model}{'_full' if full_text else ''}",
         "dotProduct": f"embedding_dot_{model}{'_full' if full_text else ''}",
         "distance": f"embedding_raw_{model}{'_full' if full_text else ''}",
     }.get(match_mode, f"embedding_cosine_{model}{'_full' if full_text else ''}")
 
+def result_collection(model=None, match_mode=SIM_MODE, full_text=False):
+    # Results are named after the ISIC variant; ESIC titles only carry the short-text vectors.
+    esic_key = vector_field(model, match_mode, full_text)
+    return get_collection(f"results{esic_key}", f"mapping_results{esic_key}")
+
+def get_base_index(model=None, match_mode=SIM_MODE, full_text=False):
+    """All ISIC rows for a model/mode: memory-mapped snapshot when fresh, else read from Mongo.
+
+    The collection fingerprint is re-checked at most every SNAPSHOT_CHECK_INTERVAL seconds.
+    """
+    key = (model, match_mode, bool(full_text))
+    entry = _base_cache.get(key)
+    now = time.time()
+    if entry and now - entry["checked_at"] < SNAPSHOT_CHECK_INTERVAL:
+        return entry["index"]
+
+    with METRICS.timer("fingerprint_check_seconds"):
+        fingerprint = get_fingerprint(isic_col)
+    if entry and entry["fingerprint"] == fingerprint:
+        entry["checked_at"] = now
+        return entry["index"]
+
+    started = time.perf_counter()
+    index = load_snapshot(isic_col, model, match_mode, full_text, fingerprint)
+    source = "snapshot"
+    if index is None:
+        index = VectorIndex.from_collection(isic_col, model, match_mode, full_text).partitioned()
+        source = "mongo"
+    METRICS.observe("index_load_seconds", time.perf_counter() - started, source=source)
+    _base_cache[key] = {"index": index, "fingerprint": fingerprint, "checked_at": now}
+    return index
+
+def base_fingerprint(model=None, match_mode=SIM_MODE, full_text=False):
+    """ISIC fingerprint the resident base index was built from; no Mongo read between checks."""
+    get_base_index(model, match_mode, full_text)
+    return _base_cache[(model, match_mode, bool(full_text))]["fingerprint"]
+
+def preload_base_indexes(model, variants):
+    """Fill the base-index cache for several (match_mode, full_text) variants with one ISIC read.
+
+    Variants with a fresh snapshot are memory-mapped; the rest share a single collection scan.
+    """
+    fingerprint = get_fingerprint(isic_col)
+    now = time.time()
+    missing = []
+    for match_mode, full_text in variants:
+        index = load_snapshot(isic_col, model, match_mode, full_text, fingerprint)
+        if index is None:
+            missing.append((match_mode, full_text))
+        else:
+            _base_cache[(model, match_mode, bool(full_text))] = {"index": index, "fingerprint": fingerprint, "checked_at": now}
+    if missing:
+        fields = {f: 1 for f in META_FIELDS}
+        for match_mode, full_text in missing:
+            fields.update(projection(model, match_mode, full_text))
+        docs = list(isic_col.find({}, fields))
+        for match_mode, full_text in missing:
+            index = VectorIndex.from_documents(docs, model, match_mode, full_text).partitioned()
+            _base_cache[(model, match_mode, bool(full_text))] = {"index": index, "fingerprint": fingerprint, "checked_at": now}
+
+def get_isic_index(model=None, match_mode=SIM_MODE, full_text=False, isic_level=None, section=None):
+    """ISIC index for a level/section filter: a zero-copy row-range view of the base index."""
+    return get_base_index(model, match_mode, full_text).partition(isic_level or 4, section)
+
+_tier_cache = {}
+
+def get_compressed_tier(model=None, match_mode=SIM_MODE, full_text=False, isic_level=None, section=None,
+                        dims=COMPRESS_DIMS, method=COMPRESS_METHOD, quantize=COMPRESS_QUANTIZE):
+    """Reduced / int8 shortlist tier over the ISIC index for this key (rebuilt when the index is)."""
+    index = get_isic_index(model, match_mode, full_text, isic_level, section)
+    key = (model, match_mode, bool(full_text), isic_level or 4, section, dims, method, quantize)
+    entry = _tier_cache.get(key)
+    if entry is None or entry[0] is not index:
+        entry = (index, index.compress(dims, method, quantize))
+        _tier_cache[key] = entry
+    return entry[1]
+
+_lexical_cache = {}
+
+def get_lexical_index():
+    """TF-IDF index over all ISIC rows: the pickle written at load time when fresh, else rebuilt."""
+    entry = _lexical_cache.get("index")
+    now = time.time()
+    if entry and now - entry["checked_at"] < SNAPSHOT_CHECK_INTERVAL:
+        return entry["index"]
+    fingerprint = get_fingerprint(isic_col)
+    if entry and entry["fingerprint"] == fingerprint:
+        entry["checked_at"] = now
+        return entry["index"]
+    from lexical_index import LexicalIndex, load_lexical_index    # sklearn / scipy only for lexical retrieval
+    index = load_lexical_index(isic_col, fingerprint) or LexicalIndex.from_collection(isic_col)
+    _lexical_cache.clear()
+    _lexical_cache["index"] = {"index": index, "fingerprint": fingerprint, "checked_at": now}
+    return index
+
+def get_aligned_lexical(index, isic_level=None, section=None):
+    """Lexical partition whose rows line up with a dense index's rows (cached per dense index)."""
+    lexical = get_lexical_index()
+    key = (id(index), isic_level, section)
+    entry = _lexical_cache.get(key)
+    if entry is None or entry[0] is not index or entry[1] is not lexical:
+        entry = (index, lexical, lexical.partition(isic_level or 4, section).aligned(index.meta))
+        _lexical_cache[key] = entry
+    return entry[2]
+
+def clear_index_cache():
+    _base_cache.clear()
+    _tier_cache.clear()
+    _lexical_cache.clear()
+
+def query_matrix(vectors, dim, rows=None):
+    """Stack query vectors into a float32 block; missing or wrong-length (failed) embeddings score as zero rows."""
+    vectors = [] if vectors is None else vectors
+    Q = np.zeros((len(vectors) if rows is None else rows, dim), dtype=np.float32)
+    for row, vec in enumerate(vectors):
+        if vec is not None and len(vec) == dim:
+            Q[row] = vec
+    return Q
+
+# ─── Lexical / Hybrid Retrieval ───────────────────────────────────
+def check_retrieval(retrieval):
+    if retrieval not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval: {retrieval} (choose from {', '.join(RETRIEVAL_MODES)})")
+
+def hybrid_search_batch(texts, queries=None, k=K_TOP, match_mode=SIM_MODE, model=None, full_text=False,
+                        isic_level=None, section=None, retrieval=None, chunk_size=CHUNK_SIZE):
+    """Top-k per ESIC text with lexical-only, lexical-shortlist → dense re-rank, or weighted fusion.
+
+    `queries` (dense vectors) are not needed for "lexical", so it works with the embedding host down.
+    """
+    retrieval = retrieval or RETRIEVAL
+    if retrieval == "lexical":
+        return get_lexical_index().partition(isic_level or 4, section).search_batch(texts, k, chunk_size)
+
+    index = get_isic_index(model, match_mode, full_text, isic_level, section)
+    lexical = get_aligned_lexical(index, isic_level, section)
+    if len(index) == 0:
+        return [[] for _ in texts]
+    Q = query_matrix(queries, index.dim, len(texts))
+
+    results = []
+    chunk_size = max(1, int(chunk_size or len(texts) or 1))
+    for start in range(0, len(texts), chunk_size):
+        lex = lexical.score_block(texts[start:start + chunk_size])
+        block = Q[start:start + chunk_size]
+        if retrieval == "rerank":
+            shortlist, _ = top_k_rows(lex, max(k, LEXICAL_SHORTLIST))
+            dense = index.score_candidates(block, shortlist)
+            order, top = top_k_rows(dense, k)
+            rows = np.take_along_axis(shortlist, order, axis=1)
+        else:
+            fused = (1.0 - LEXICAL_WEIGHT) * index.score_block(block) + LEXICAL_WEIGHT * lex
+            rows, top = top_k_rows(fused, k)
+        results.extend(index.format_matches(i, s) for i, s in zip(rows, top))
+    return results
+
+# ─── Matching Logic ───────────────────────────────────────────────
+@timed("search_seconds", kind="single")
+def find_best_matches(esic_vec, k=K_TOP, match_mode=SIM_MODE, model=None, full_text=False, isic_level=None, section=None, compressed=None,
+                      text=None, retrieval=None):
+    retrieval = retrieval or RETRIEVAL
+    if retrieval != "dense" and text is not None:
+        return hybrid_search_batch([text], None if esic_vec is None else [esic_vec], k, match_mode, model, full_text,
+                                   isic_level, section, retrieval)[0]
+    compressed = COMPRESSED if compressed is None else compressed
+    if compressed:
+        tier = get_compressed_tier(model, match_mode, full_text, isic_level, section)
+        return tier.search(esic_vec, k, oversample=OVERSAMPLE)
+    index = get_isic_index(model, match_mode, full_text, isic_level, section)
+    return index.search(esic_vec, k)
+
+@timed("search_seconds", kind="batch")
+def find_best_matches_batch(esic_vecs, k=K_TOP, match_mode=SIM_MODE, model=None, full_text=False, isic_level=None, section=None,
+                            compressed=None, texts=None, retrieval=None, chunk_size=CHUNK_SIZE):
+    """find_best_matches for many queries sharing the same filters, scored as one matrix block."""
+    retrieval = retrieval or RETRIEVAL
+    METRICS.inc("search_queries_total", len(texts if esic_vecs is None else esic_vecs), retrieval=retrieval)
+    if retrieval != "dense" and texts is not None:
+        return hybrid_search_batch(texts, esic_vecs, k, match_mode, model, full_text, isic_level, section, retrieval, chunk_size)
+    index = get_isic_index(model, match_mode, full_text, isic_level, section)
+    queries = query_matrix(esic_vecs, index.dim)
+    compressed = COMPRESSED if compressed is None else compressed
+    if compressed:
+        tier = get_compressed_tier(model, match_mode, full_text, isic_level, section)
+        return tier.search_batch(queries, k=k, chunk_size=chunk_size, oversample=OVERSAMPLE)
+    return index.search_batch(queries, k=k, chunk_size=chunk_size)
+
+@timed("search_seconds", kind="beam")
+def find_hierarchical_matches(esic_vec, k=K_TOP, match_mode=SIM_MODE, model=None, full_text=False, isic_level=None, section=None, beam=None, start_level=None):
+    """Coarse-to-fine search: only children of the best `beam` nodes per level are scored.
+
+    Each match carries a `path` of its scored ancestors (section → division → group).
+    """
+    index = get_base_index(model, match_mode, full_text)
+    return index.search_hierarchical(
+        esic_vec, k, beam or BEAM_WIDTH, start_level or START_LEVEL, isic_level or 4, section
+    )
+
+# ─── Mapping Fingerprints ─────────────────────────────────────────
+def vector_fingerprint(vec):
+    return hashlib.sha256(np.asarray(vec, dtype="<f4").tobytes()).hexdigest()[:16]
+
+def text_fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def index_fingerprint(model, match_mode, full_text=False, k_top=None, compressed=False, hierarchical=False, beam=None, retrieval="dense"):
+    """Fingerprint of the ISIC collection plus every parameter that shapes a mapping result."""
+    params = [
+        get_fingerprint(isic_col), model, match_mode, bool(full_text), k_top,
+        [COMPRESS_METHOD, COMPRESS_DIMS, COMPRESS_QUANTIZE, OVERSAMPLE] if compressed else None,
+        [beam or BEAM_WIDTH, START_LEVEL] if hierarchical else None,
+    ]
+    if retrieval != "dense":
+        params.append([retrieval, LEXICAL_WEIGHT, LEXICAL_SHORTLIST])
+    return hashlib.sha256(json.dumps(params, default=str).encode()).hexdigest()[:16]
+
+# ─── Compact Result Schema ────────────────────────────────────────
+LABEL_FIELDS = ["code", "description", "level", "section_label", "division_label", "group_label"]
+
+def compact_matches(matches):
+    """Stored form of a match list: ISIC reference, score and rank only."""
+    return [
+        {"full_code": m["full_code"], "score": m["score"], "rank": rank}
+        for rank, m in enumerate(matches, 1)
+    ]
 
-     # ── Add Level Filter Here ──
-    query_filter = {"level": isic_level or 4}
-    if section != None:
-        query_filter["section_label"] = section
-
-    projection_fields = {
-        isic_key: 1,
-        "code": 1,
-        "full_code": 1,
-        "description": 1,
-        "section_label": 1,
-        "division_label": 1,
-        "group_label": 1,
-        "class": 1,
-        "level":1
-    }
-
-    # print("f1")
-    # print(isic_col.find_one())
-    # print("f1 str")
-    # print(isic_col.find_one({"level": {"$type": "string"}}))
-    # print("f1 l5")
-    # print(isic_col.find_one({"level": "5"}))
-
-
-
-    scored = []
-    for isic in isic_col.find(query_filter, projection_fields):
-        vec2 = isic.get(isic_key)
-        if vec2:
-            score = compute_score(esic_vec, vec2, match_mode)
-           
-            scored.append({
-                            "code": isic.get("code"),
-                            "full_code": isic.get("full_code"),
-                            "description": isic.get("description"),
-                            "section_label": isic.get("section_label"),
-                            "division_label": isic.get("division_label"),
-                            "group_label": isic.get("group_label"),
-                            "class": isic.get("class"),
-                            "level": isic.get("level"),
-                            "score": round(score, 3)
-                        })
-
-    return sorted(scored, key=lambda x: x["score"], reverse=True)[:k]
+def isic_lookup(fields=LABEL_FIELDS):
+    """full_code → ISIC labels, for joining compact results back at export or display time."""
+    fields = {f: 1 for f in fields}
+    return {doc["full_code"]: doc for doc in isic_col.find({}, {"_id": 0, "full_code": 1, **fields})}
+
+def expand_results(records, lookup):
+    """Join ISIC labels onto stored matches; fields already on a match (older results) win."""
+    for record in records:
+        record["matches"] = [{**lookup.get(m.get("full_code"), {}), **m} for m in record.get("matches", [])]
+    return records
+
+@timed("result_write_seconds")
+def flush_results(result_col, records, upsert=False):
+    if not records:
+        return
+    METRICS.inc("results_written_total", len(records))
+    if upsert:
+        result_col.bulk_write([ReplaceOne({"esic_code": r["esic_code"]}, r, upsert=True) for r in records], ordered=False)
+    else:
+        result_col.insert_many(records, ordered=False)
 
 # ─── Batch Mapping ────────────────────────────────────────────────
-def map_esic_to_isic(store=True, verbose=False, match_mode=SIM_MODE, model=None, k_top=None, full_text=False):
-    esic_key  = {
-        "cosine": f"embedding_cosine_{model}{'_full' if full_text else ''}",
-        "dotProduct": f"embedding_dot_{model}{'_full' if full_text else ''}",
-        "distance": f"embedding_raw_{model}{'_full' if full_text else ''}",
-    }.get(match_mode, f"embedding_cosine_{model}{'_full' if full_text else ''}")
+def load_esic_vectors(model, match_mode=SIM_MODE):
+    """ESIC documents that carry a vector for this model, with the vectors in the mode's space."""
+    return load_esic_variants(model, [match_mode])[match_mode]
 
+@timed("esic_read_seconds")
+def load_esic_variants(model, match_modes):
+    """{match_mode: (entries, vectors)} from a single ESIC read."""
+    fields = {"code": 1, "title": 1}
+    for match_mode in match_modes:
+        fields.update(projection(model, match_mode))
+    variants = {match_mode: ([], []) for match_mode in match_modes}
+    for esic in esic_col.find({}, fields):
+        for match_mode, (entries, vectors) in variants.items():
+            vec = derive_vector(esic, model, match_mode)
+            if vec is not None:
+                entries.append(esic)
+                vectors.append(vec)
+    return variants
 
-    total = esic_col.count_documents({})
+def map_esic_to_isic(store=True, verbose=False, match_mode=SIM_MODE, model=None, k_top=None, full_text=False, batch=True, chunk_size=CHUNK_SIZE, compressed=None, hierarchical=False, beam=None, incremental=False, esic=None, retrieval=None, resume=False):
+    """Map every ESIC entry to its top-k ISIC matches; returns {esic_code: compact matches}.
 
-    result_col = db[config["collections"].get(f"results{esic_key}", f"mapping_results{esic_key}")]
-    if store:
+    `esic` may pass pre-loaded (entries, vectors) so several runs share one ESIC read.
+    With `resume`, an interrupted run keeps every result batch it already wrote (as in incremental mode).
+    """
+    result_col = result_collection(model, match_mode, full_text)
+
+    started = time.time()
+    retrieval = retrieval or RETRIEVAL
+    check_retrieval(retrieval)
+    if retrieval == "lexical" and esic is None:
+        # Title-only scoring: every ESIC entry, whether or not its embedding succeeded
+        entries = list(esic_col.find({}, {"code": 1, "title": 1}))
+        vectors = [None] * len(entries)
+    else:
+        entries, vectors = esic or load_esic_vectors(model, match_mode)
+    compressed = COMPRESSED if compressed is None else compressed
+    index_fp = index_fingerprint(model, match_mode, full_text, k_top, compressed, hierarchical, beam, retrieval)
+    esic_fps = [vector_fingerprint(vec) if vec is not None else text_fingerprint(esic.get("title", ""))
+                for esic, vec in zip(entries, vectors)]
+
+    # Every flushed result batch is checkpointed; resuming re-maps only what was never written
+    job = Job("map", {"index": index_fp, "collection": result_col.name}, resume=resume) if store else None
+    incremental = incremental or bool(job and job.resumed)
+
+    partial = False
+    if store and incremental:
+        stored = {r["esic_code"]: r for r in result_col.find({}, {"esic_code": 1, "esic_fingerprint": 1, "index_fingerprint": 1})}
+        partial = bool(stored) and all(r.get("index_fingerprint") == index_fp for r in stored.values())
+        if partial:
+            # Same ISIC index and parameters: only re-map ESIC entries whose vector changed
+            pending = [i for i, (esic, fp) in enumerate(zip(entries, esic_fps))
+                       if stored.get(esic["code"], {}).get("esic_fingerprint") != fp]
+            removed = set(stored) - {esic["code"] for esic in entries}
+            if removed:
+                result_col.delete_many({"esic_code": {"$in": list(removed)}})
+            print(f"♻️ Incremental mapping: {len(pending)} changed, {len(entries) - len(pending)} reused, {len(removed)} removed.")
+            if job.resumed:
+                job.skip(len(entries) - len(pending), chunks=len(job.done_chunks))
+            entries = [entries[i] for i in pending]
+            vectors = [vectors[i] for i in pending]
+            esic_fps = [esic_fps[i] for i in pending]
+        elif stored:
+            print("♻️ ISIC index or mapping parameters changed; running a full pass.")
+
+    total = len(entries)
+    if store and not partial:
         
         result_col.delete_many({})
         print("🧹 Cleared previous mapping results.")
 
-    for idx, esic in enumerate(esic_col.find({}, {"code": 1, "title": 1, esic_key: 1}), 1):
-        esic_vec = esic.get(esic_key)
-        if not esic_vec:
-            continue
+    if hierarchical:
+        all_matches = (
+            find_hierarchical_matches(vec, k=k_top or K_TOP, match_mode=match_mode, model=model, full_text=full_text, beam=beam)
+            for vec in vectors
+        )
+    elif retrieval != "dense":
+        with METRICS.timer("score_seconds", retrieval=retrieval):
+            all_matches = hybrid_search_batch([e.get("title", "") for e in entries], vectors,
+                                              k_top or K_TOP, match_mode, model, full_text, retrieval=retrieval, chunk_size=chunk_size)
+    elif batch:
+        with METRICS.timer("score_seconds", retrieval="compressed" if compressed else "dense"):
+            index = get_isic_index(model, match_mode, full_text)
+            queries = query_matrix(vectors, index.dim)
+            if compressed:
+                tier = get_compressed_tier(model, match_mode, full_text)
+                all_matches = tier.search_batch(queries, k=k_top, chunk_size=chunk_size, oversample=OVERSAMPLE)
+            else:
+                all_matches = index.search_batch(queries, k=k_top, chunk_size=chunk_size)
+    else:
+        all_matches = (
+            find_best_matches(vec, match_mode=match_mode, model=model, k=k_top, full_text=full_text, compressed=compressed)
+            for vec in vectors
+        )
 
-        matches = find_best_matches(esic_vec, match_mode=match_mode, model=model, k=k_top)
+    pending, results = [], {}
+    for idx, (esic, matches, esic_fp) in enumerate(zip(entries, all_matches, esic_fps), 1):
         record = {
             "esic_code": esic["code"],
             "title": esic.get("title", ""),
-            "matches": matches,
-            "match_mode": match_mode
+            "matches": compact_matches(matches),
+            "match_mode": match_mode,
+            "esic_fingerprint": esic_fp,
+            "index_fingerprint": index_fp
         }
 
-        
-
+        results[record["esic_code"]] = record["matches"]
         if store:
-            
-            result_col.insert_one(record)
+            pending.append(record)
+            if len(pending) >= WRITE_BATCH:
+                flush_results(result_col, pending, upsert=partial)
+                job.checkpoint(len(job.done_chunks), len(pending))
+                pending = []
 
         if verbose and idx <= 5:
             print(f"\n🔹 ESIC {record['esic_code']}: {record['title']}")
@@ -149,4 +450,84 @@ def map_esic_to_isic(store=True, verbose=False, match_mode=SIM_MODE, model=None,
             # print(f"   ▶ Mapped {idx}/{total}")
             progress(idx, total, prefix="▶ Mapped")
 
-    print(f"\n✅ Completed mapping {total} ESIC entries using mode: {match_mode}")
+    if store:
+        flush_results(result_col, pending, upsert=partial)
+        if pending:
+            job.checkpoint(len(job.done_chunks), len(pending))
+        job.complete()
+
+    print(f"\n✅ Completed mapping {total} ESIC entries using mode: {match_mode} in {time.time() - started:.2f}s")
+    if job and job.resumed:
+        job.report()
+    return results
+
+# ─── Multi-Configuration Sweep ────────────────────────────────────
+MATCH_MODES = ["cosine", "distance", "dotProduct"]
+
+def sweep_mappings(model=None, k_top=None, store=True, match_modes=MATCH_MODES, full_texts=(False, True), chunk_size=CHUNK_SIZE):
+    """Map every match_mode × full_text variant from one ESIC read and one ISIC read.
+
+    Returns (entries, variants) where each variant is {name, match_mode, full_text, results, seconds}.
+    """
+    started = time.time()
+    esic = load_esic_variants(model, match_modes)
+    preload_base_indexes(model, [(m, f) for m in match_modes for f in full_texts])
+    print(f"📦 Loaded ESIC and ISIC vectors for {len(match_modes) * len(full_texts)} variants in {time.time() - started:.2f}s")
+
+    variants = []
+    for match_mode in match_modes:
+        for full_text in full_texts:
+            variant_started = time.time()
+            results = map_esic_to_isic(store=store, match_mode=match_mode, model=model, k_top=k_top,
+                                       full_text=full_text, chunk_size=chunk_size, compressed=False, esic=esic[match_mode])
+            variants.append({
+                "name": vector_field(model, match_mode, full_text),
+                "match_mode": match_mode,
+                "full_text": full_text,
+                "results": results,
+                "seconds": time.time() - variant_started,
+            })
+    entries = max((entries for entries, _ in esic.values()), key=len, default=[])
+    return entries, variants
+
+def sweep_summary(variants):
+    """Per-variant mean top-1 score, mean top-1/top-2 margin and top-1 agreement with the first variant."""
+    baseline = variants[0]["results"] if variants else {}
+    rows = []
+    for variant in variants:
+        results = variant["results"]
+        tops = [m for m in results.values() if m]
+        margins = [m[0]["score"] - m[1]["score"] for m in tops if len(m) > 1]
+        agree = sum(1 for code, m in results.items() if m and baseline.get(code) and m[0]["full_code"] == baseline[code][0]["full_code"])
+        rows.append({
+            "name": variant["name"],
+            "entries": len(results),
+            "top1": float(np.mean([m[0]["score"] for m in tops])) if tops else 0.0,
+            "margin": float(np.mean(margins)) if margins else 0.0,
+            "agreement": agree / max(1, len(results)),
+            "seconds": variant["seconds"],
+        })
+    return rows
+
+# ─── Compressed Tier Recall Report ────────────────────────────────
+def compression_report(model=None, match_mode=SIM_MODE, full_text=False, k=5, dims_options=(128, 256, 512),
+                       methods=("truncate", "pca"), oversample=OVERSAMPLE, chunk_size=CHUNK_SIZE):
+    """Recall@k and size of each compressed configuration against exact search, using ESIC titles as queries."""
+    index = get_isic_index(model, match_mode, full_text)
+    _, vectors = load_esic_vectors(model, match_mode)
+    queries = np.array([v for v in vectors if len(v) == index.dim], dtype=np.float32)
+
+    started = time.time()
+    index.search_batch(queries, k, chunk_size)
+    rows = [{"method": "exact", "dims": index.dim, "int8": False, "bytes": index.matrix.nbytes,
+             "recall": 1.0, "seconds": time.time() - started}]
+
+    for method in methods:
+        for dims in dims_options:
+            for quantize in (True, False):
+                tier = index.compress(dims, method, quantize)
+                started = time.time()
+                recall = recall_at_k(index, tier, queries, k, oversample, chunk_size)
+                rows.append({"method": method, "dims": tier.dims, "int8": quantize, "bytes": tier.nbytes,
+                             "recall": recall, "seconds": time.time() - started})
+    return rows
@@ -0,0 +1,246 @@
+# File: match_service.py
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from registry import get_config
+import embedding_utils
+from embedding_utils import get_raw_embeddings, normalize_vector, set_backend
+from mapper import find_best_matches_batch, get_base_index, K_TOP, SIM_MODE, RETRIEVAL, RETRIEVAL_MODES
+from logger import banner
+from metrics import METRICS
+
+# ─── Load Config ─────────────────────────────────────────────
+config = get_config()
+
+service_config = config.get("service", {})
+HOST          = os.getenv("SERVICE_HOST", service_config.get("host", "0.0.0.0"))
+PORT          = int(os.getenv("SERVICE_PORT", service_config.get("port", 8600)))
+MAX_BATCH     = int(service_config.get("max_batch", 64))
+MAX_WAIT_MS   = float(service_config.get("max_wait_ms", 5))
+MAX_TEXTS     = int(service_config.get("max_texts", 1000))
+DEFAULT_MODEL = service_config.get("model", "mxbai-embed-large")
+
+# ─── Micro-Batching ──────────────────────────────────────────
+class MicroBatcher:
+    """Coalesces concurrent requests into batches of up to max_batch texts.
+
+    A batch closes when it is full or max_wait_ms after its first request arrived;
+    texts sharing the same search parameters are embedded and scored together.
+    """
+
+    def __init__(self, handler, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, key, text):
+        future = Future()
+        self.queue.put((key, text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for key, items in groups.items():
+                try:
+                    results = self.handler(key, [text for _, text, _ in items])
+                    for (_, _, future), result in zip(items, results):
+                        if isinstance(result, Exception):
+                            future.set_exception(result)
+                        else:
+                            future.set_result(result)
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+            self.batches += 1
+            self.texts += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+# ─── Matching ────────────────────────────────────────────────
+class ServiceError(RuntimeError):
+    status = 500
+
+class EmbeddingUnavailable(ServiceError):
+    status = 503
+
+def match_texts(key, texts):
+    """One embedding call and one scoring block for texts sharing (model, mode, filters, k).
+
+    Texts the embedding service returned no vector for come back as EmbeddingUnavailable
+    items; they are never scored as zero vectors.
+    """
+    model, match_mode, full_text, level, section, k, retrieval = key
+    if retrieval == "lexical":
+        return find_best_matches_batch(None, k=k, match_mode=match_mode, model=model, full_text=full_text,
+                                       isic_level=level, section=section, texts=texts, retrieval=retrieval)
+    index = get_base_index(model, match_mode, full_text)
+    if len(index) == 0:
+        raise ServiceError(f"no ISIC vectors stored for model {model}")
+    raws = get_raw_embeddings(texts, model)
+    embedded = [i for i, raw in enumerate(raws) if raw]
+    for i in embedded:
+        if len(raws[i]) != index.dim:
+            raise ServiceError(f"{model} returned {len(raws[i])}-dim vectors but the ISIC index holds {index.dim}-dim ones")
+
+    results = [EmbeddingUnavailable(f"no embedding returned by {model} for '{text[:60]}'") for text in texts]
+    if embedded:
+        matches = find_best_matches_batch([normalize_vector(raws[i], match_mode) for i in embedded], k=k,
+                                          match_mode=match_mode, model=model, full_text=full_text, isic_level=level,
+                                          section=section, texts=[texts[i] for i in embedded], retrieval=retrieval)
+        for i, found in zip(embedded, matches):
+            results[i] = found
+    return results
+
+batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    global batcher
+    with _batcher_lock:
+        if batcher is None:
+            batcher = MicroBatcher(match_texts)
+    return batcher
+
+# ─── Request Parsing ─────────────────────────────────────────
+def search_key(body):
+    """Search parameters with find_best_matches defaults; raises ValueError on bad input."""
+    match_mode = body.get("match_mode", SIM_MODE)
+    retrieval = body.get("retrieval", RETRIEVAL)
+    if match_mode not in ("cosine", "dotProduct", "distance"):
+        raise ValueError(f"unknown match_mode: {match_mode}")
+    if retrieval not in RETRIEVAL_MODES:
+        raise ValueError(f"unknown retrieval: {retrieval}")
+    level = body.get("level")
+    model = body.get("model", DEFAULT_MODEL)
+    if embedding_utils.BACKEND == "fake" and not model.startswith("fake-"):
+        model = f"fake-{model}"     # fake vectors are stored under their own key (see bench.py)
+    return (
+        model,
+        match_mode,
+        bool(body.get("full_text", False)),
+        int(level) if level is not None else None,
+        body.get("section"),
+        int(body.get("k", K_TOP)),
+        retrieval,
+    )
+
+# ─── HTTP Handler ────────────────────────────────────────────
+class MatchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._reply(200, {"status": "ok", "batching": get_batcher().stats()})
+        if self.path == "/metrics":
+            return self._reply_text(200, METRICS.to_prometheus(), "text/plain; version=0.0.4")
+        self._reply(404, {"error": f"unknown path: {self.path}"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            key = search_key(body)
+            if self.path == "/match":
+                text = str(body.get("text") or "").strip()
+                if not text:
+                    raise ValueError("'text' is required")
+                matches = get_batcher().submit(key, text).result()
+                payload = {"text": text, "matches": matches}
+            elif self.path == "/match/batch":
+                texts = [str(t or "").strip() for t in body.get("texts") or []]
+                if not texts or len(texts) > MAX_TEXTS:
+                    raise ValueError(f"'texts' must hold 1..{MAX_TEXTS} titles")
+                # Submitted individually so they coalesce with concurrent /match calls
+                futures = [get_batcher().submit(key, text) for text in texts]
+                results, errors = [], []
+                for text, future in zip(texts, futures):
+                    try:
+                        results.append({"text": text, "matches": future.result()})
+                    except EmbeddingUnavailable as e:
+                        # Per-item error; the batch only fails when no title could be embedded
+                        errors.append(e)
+                        results.append({"text": text, "error": str(e)})
+                if len(errors) == len(texts):
+                    raise errors[0]
+                payload = {"results": results}
+            else:
+                return self._reply(404, {"error": f"unknown path: {self.path}"})
+        except ServiceError as e:
+            return self._reply(e.status, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        except Exception as e:
+            return self._reply(500, {"error": str(e)})
+        elapsed = time.perf_counter() - started
+        METRICS.observe("service_request_seconds", elapsed, path=self.path)
+        payload["ms"] = round(elapsed * 1000, 2)
+        self._reply(200, payload)
+
+    def _reply(self, status, payload):
+        self._reply_text(status, json.dumps(payload, default=str), "application/json")
+
+    def _reply_text(self, status, text, content_type):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if os.getenv("SERVICE_VERBOSE", "false").lower() == "true":
+            super().log_message(format, *args)
+
+# ─── Server Entry ────────────────────────────────────────────
+class MatchServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256    # socketserver's default backlog of 5 resets bursts of clients
+
+def run_service(host=HOST, port=PORT, fake=False):
+    if fake:
+        set_backend("fake")
+    server = MatchServer((host, port), MatchHandler)
+    banner(f"🛰️ Match service on http://{host}:{port} (/match, /match/batch, /health, /metrics){' with fake embeddings' if fake else ''}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    port = int(args[args.index("--port") + 1]) if "--port" in args else PORT
+    run_service(port=port, fake="--fake" in args)
@@ -0,0 +1,222 @@
+# File: metrics.py
+
+import os
+import json
+import time
+import bisect
+import datetime
+import functools
+import threading
+from contextlib import contextmanager
+from registry import get_config
+
+# ─── Load Config ─────────────────────────────────────────────
+metrics_config = get_config().get("metrics", {})
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", str(metrics_config.get("enabled", True))).lower() == "true"
+METRICS_DIR     = os.getenv("METRICS_DIR", metrics_config.get("dir", "output/metrics"))
+PREFIX          = "esic_"
+
+# Seconds; wide enough for a 1 ms cache lookup and a 60 s embedding timeout
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# ─── Latency Histogram ───────────────────────────────────────
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus-style cumulative buckets on export)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 6),
+        }
+
+# ─── Process-Wide Registry ───────────────────────────────────
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+class Metrics:
+    """Counters and latency histograms keyed by (name, labels); safe to use from worker threads.
+
+    `capture()` additionally collects the spans timed on the calling thread, so one query
+    can be broken down stage by stage (used by the web UI).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((name, dict(_key(name, labels)[1]), seconds))
+        if not METRICS_ENABLED:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def capture(self):
+        """Collect (name, labels, seconds) for every span timed on this thread inside the block."""
+        previous = getattr(self._local, "spans", None)
+        self._local.spans = spans = []
+        try:
+            yield spans
+        finally:
+            self._local.spans = previous
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def __bool__(self):
+        return bool(self.counters or self.histograms)
+
+    # ── Export ───────────────────────────────────────────────────
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "elapsed": round(time.time() - self.started, 3),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())],
+                "timings": [{"name": n, "labels": dict(l), **h.summary()} for (n, l), h in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{PREFIX}{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{_label_text(labels)} {value}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                metric = f"{PREFIX}{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{_label_text(labels, [('le', '+Inf')])} {hist.count}")
+                lines.append(f"{metric}_sum{_label_text(labels)} {hist.sum:.6f}")
+                lines.append(f"{metric}_count{_label_text(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, run_name, out_dir=METRICS_DIR):
+        """Write <run>_<timestamp>.json and .prom under out_dir; returns the JSON path."""
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(out_dir, f"{run_name}_{stamp}")
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump({"run": run_name, **self.snapshot()}, f, indent=2)
+        with open(f"{base}.prom", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        return f"{base}.json"
+
+    def report(self):
+        """Per-stage table: time spent, call count, mean / p95 latency, then counters."""
+        data = self.snapshot()
+        if data["timings"]:
+            print(f"{'stage':<52}{'calls':>8}{'total':>10}{'mean':>10}{'p95':>10}")
+            for t in sorted(data["timings"], key=lambda t: -t["sum"]):
+                print(f"{t['name'] + _label_text(t['labels'].items()):<52}{t['count']:>8}{t['sum']:>9.2f}s"
+                      f"{t['mean'] * 1000:>8.1f}ms{t['p95'] * 1000:>8.1f}ms")
+        for c in data["counters"]:
+            print(f"   {c['name']}{_label_text(c['labels'].items())}: {c['value']}")
+
+METRICS = Metrics()
+
+def timed(name, **labels):
+    """Decorator: record every call of the function as a `name` span."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def format_spans(spans):
+    """[(stage, ms)] for a captured span list, summing repeated stages in first-seen order."""
+    totals = {}
+    for name, labels, seconds in spans:
+        stage = name.replace("_seconds", "") + (f" ({', '.join(labels.values())})" if labels else "")
+        totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+    return list(totals.items())
+
+# ─── MongoDB Command Timings ─────────────────────────────────
+def mongo_listeners():
+    """pymongo event listeners recording every command's latency (registered by registry.get_client)."""
+    if not METRICS_ENABLED:
+        return []
+    from pymongo import monitoring
+
+    class CommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            METRICS.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+        def failed(self, event):
+            METRICS.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+            METRICS.inc("mongo_command_errors_total", command=event.command_name)
+
+    return [CommandTimer()]
@@ -1,88 +1,187 @@
 import sys
 import os
-import yaml
-import openpyxl
-import xlsxwriter
-from dotenv import load_dotenv
-from pymongo import MongoClient
-from embedding_utils import get_all_embeddings, get_embedding
-from esic_loader import load_esic
-from isic_loader import load_isic
-from mapper import map_esic_to_isic
-from logger import banner, progress, done
+import csv
+import time
+import subprocess
+from registry import get_config, get_db, get_collection, get_session, LazyCollection
+from logger import banner, done
 
 # ─── Load Config ────────────────────────────────────────
-load_dotenv()
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+# Command modules (loaders, mapper, exporters, bench, reasoning) are imported inside the
+# functions that use them, so e.g. "test" or "reset" never loads sklearn, openpyxl or xlsxwriter.
+config = get_config()
 
-mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
-client = MongoClient(mongo_uri)
-db = client["industry_mapping"]
+esic_col = LazyCollection("esic")
+isic_col = LazyCollection("isic")
 
-esic_col = db[config["collections"]["esic"]]
-isic_col = db[config["collections"]["isic"]]
 
+# ─── Lazily Imported Commands ───────────────────────────
+def load_esic(*args, **kwargs):
+    from esic_loader import load_esic
+    return load_esic(*args, **kwargs)
 
+def load_isic(*args, **kwargs):
+    from isic_loader import load_isic
+    return load_isic(*args, **kwargs)
 
+def map_esic_to_isic(*args, **kwargs):
+    from mapper import map_esic_to_isic
+    return map_esic_to_isic(*args, **kwargs)
 
-# ─── Export to Excel ────────────────────────────────────
-def export_results_to_excel(filename="mapping_results.xlsx", model=None, full_text=False, match_mode=None):
-    esic_key  = {
-        "cosine": f"embedding_cosine_{model}{'_full' if full_text else ''}",
-        "dotProduct": f"embedding_dot_{model}{'_full' if full_text else ''}",
-        "distance": f"embedding_raw_{model}{'_full' if full_text else ''}",
-    }.get(match_mode, f"embedding_cosine_{model}{'_full' if full_text else ''}")
+# ─── Export Results ─────────────────────────────────────
+def export_results_to_excel(filename="mapping_results.xlsx", model=None, full_text=False, match_mode=None, k=5, fmt="xlsx"):
+    from mapper import vector_field, isic_lookup, expand_results
+    from result_export import export_collection, check_format, FORMATS
+    check_format(fmt)
+    esic_key  = vector_field(model, match_mode, full_text)
 
-    result_col = db[config["collections"].get(f"results{esic_key}", f"mapping_results{esic_key}")]
-    results = list(result_col.find())
-    banner(f"📤 Exporting {len(results)} mappings to {esic_key}_{filename}")
-    wb = xlsxwriter.Workbook(f"output/{esic_key}_{filename}")
-    ws = wb.add_worksheet("ESIC-ISIC Mapping")
+    result_col = get_collection(f"results{esic_key}", f"mapping_results{esic_key}")
+    filename = os.path.splitext(filename)[0] + FORMATS[fmt]
+    # Stored matches only reference ISIC codes; labels are joined from one in-memory lookup
+    lookup = isic_lookup()
+    return export_collection(result_col, f"output/{esic_key}_{filename}", k, fmt,
+                             transform=lambda batch: expand_results(batch, lookup))
 
-    sample_k = len(results[0]["matches"]) if results else 0
 
-    # Build match header blocks in correct logical sequence
-    full_headers = ["ESIC Code", "Title of Category"]
-    for i in range(sample_k):
-        full_headers += [
-            f"Match {i+1} ISIC Code",
-            f"Match {i+1} ISIC Description",
-            f"Match {i+1} Score"
+# ─── Test Embedding ─────────────────────────────────────
+def test_embedding():
+    from embedding_utils import get_embedding
+    sample = "Growing of cereals including maize and teff"
+    vector = get_embedding(sample)
+    done(f"Vector length: {len(vector)}")
+    print(f"First 5 dimensions: {vector[:5]}")
+
+# ─── Migrate to Compact Vector Storage ──────────────────
+def collection_size(col):
+    try:
+        return get_db().command("collstats", col.name).get("size", 0)
+    except Exception:
+        return None
+
+def migrate_vectors():
+    from vector_store import migrate_collection
+    from snapshot import stamp_collection
+    for col in [esic_col, isic_col]:
+        before = collection_size(col)
+        banner(f"🔁 Migrating embeddings in {col.name} to float32 Binary fields")
+        migrated = migrate_collection(col)
+        stamp_collection(col)
+        after = collection_size(col)
+        sizes = f" ({before / 1e6:.1f} MB → {after / 1e6:.1f} MB)" if before and after else ""
+        done(f"Migrated {migrated} documents in {col.name}{sizes}")
+
+# ─── Memory-Mapped ISIC Snapshot ────────────────────────
+def snapshot_isic(models=None):
+    from snapshot import write_snapshot
+    models = models or [
+                            # "nomic-embed-text", 
+                            "mxbai-embed-large", 
+                            # "bge-m3"
         ]
+    for model in models:
+        banner(f"📸 Writing ISIC snapshot for {model}")
+        fingerprint, rows, variants = write_snapshot(isic_col, model)
+        done(f"Snapshot {fingerprint}: {rows} rows × {len(variants)} variants ({', '.join(variants)})")
 
-    # Write headers
-    for col, header in enumerate(full_headers):
-        ws.write(0, col, header)
+# ─── Compressed Tier Recall ─────────────────────────────
+def report_recall(model="mxbai-embed-large", match_mode="cosine", k=5, dims_options=(128, 256, 512)):
+    from mapper import compression_report
+    banner(f"📏 Recall@{k} of compressed ISIC tiers vs exact search ({model}, {match_mode})")
+    rows = compression_report(model=model, match_mode=match_mode, k=k, dims_options=dims_options)
+    exact_bytes = rows[0]["bytes"] or 1
+    print(f"{'method':<10}{'dims':>6}{'int8':>6}{'size':>10}{'ratio':>8}{f'recall@{k}':>11}{'time':>9}")
+    for row in rows:
+        print(
+            f"{row['method']:<10}{row['dims']:>6}{'yes' if row['int8'] else 'no':>6}"
+            f"{row['bytes'] / 1e6:>8.2f}MB{exact_bytes / max(1, row['bytes']):>7.1f}x"
+            f"{row['recall']:>11.3f}{row['seconds']:>8.3f}s"
+        )
 
-    # Write each row based on header alignment
-    for idx, record in enumerate(results, start=1):
-        ws.write(idx, 0, record.get("esic_code", ""))
-        ws.write(idx, 1, record.get("title", ""))
+# ─── Configuration Sweep ────────────────────────────────
+def run_sweep(model="mxbai-embed-large", k=5, filename="sweep_results.csv"):
+    from mapper import sweep_mappings, sweep_summary
+    banner(f"🧭 Sweeping every match mode × text span for {model}")
+    entries, variants = sweep_mappings(model=model, k_top=k)
 
-        for i, match in enumerate(record.get("matches", [])):
-            col_offset = 2 + i * 3
-            ws.write(idx, col_offset,     match.get("full_code", ""))
-            ws.write(idx, col_offset + 1, match.get("description", ""))
-            ws.write(idx, col_offset + 2, match.get("score", 0.0))
+    rows = sweep_summary(variants)
+    print(f"\n{'variant':<44}{'entries':>8}{'top-1':>8}{'margin':>8}{'agree':>7}{'time':>9}")
+    for row in rows:
+        print(
+            f"{row['name']:<44}{row['entries']:>8}{row['top1']:>8.3f}{row['margin']:>8.3f}"
+            f"{row['agreement']:>7.1%}{row['seconds']:>8.2f}s"
+        )
+    print(f"   (agree = top-1 agreement with {rows[0]['name'] if rows else '-'})")
 
-        progress(idx, len(results), prefix="▶ Excel Export")
+    # Side-by-side top-1 per ESIC entry across all variants
+    path = f"output/{model}_{filename}"
+    os.makedirs("output", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ESIC Code", "Title of Category"] + [
+            f"{v['name']} {col}" for v in variants for col in ("ISIC Code", "Score")
+        ])
+        for esic in entries:
+            row = [esic["code"], esic.get("title", "")]
+            for variant in variants:
+                top = (variant["results"].get(esic["code"]) or [{}])[0]
+                row += [top.get("full_code", ""), top.get("score", "")]
+            writer.writerow(row)
+    done(f"Wrote {len(variants)} result collections and side-by-side comparison to {path}")
 
-    wb.close()
-    done(f"Exported {len(results)} rows to {esic_key}_{filename}")
+# ─── Startup Timing ─────────────────────────────────────
+STARTUP_MODULES = ["registry", "embedding_utils", "esic_loader", "isic_loader", "mapper",
+                   "result_export", "generative_mapper", "bench", "pipeline"]
+HEAVY_MODULES   = ["pymongo", "requests", "sklearn", "scipy", "openpyxl", "xlsxwriter", "pyarrow", "streamlit"]
 
+def measure_import(module):
+    """(seconds, heavy dependencies loaded) for a cold import of `module` in a fresh interpreter."""
+    code = (
+        "import sys, time; t = time.perf_counter(); import " + module + "; dt = time.perf_counter() - t; "
+        f"print(dt, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        return None, out.stderr.strip().splitlines()[-1:] or ["import failed"]
+    seconds, _, heavy = out.stdout.strip().splitlines()[-1].partition(" ")
+    return float(seconds), heavy.split(",") if heavy else []
 
-# ─── Test Embedding ─────────────────────────────────────
-def test_embedding():
-    sample = "Growing of cereals including maize and teff"
-    vector = get_embedding(sample)
-    done(f"Vector length: {len(vector)}")
-    print(f"First 5 dimensions: {vector[:5]}")
+def report_startup(runs=3):
+    banner(f"⏱️ Cold import times (best of {runs}, fresh interpreter each)")
+    print(f"{'module':<20}{'import':>10}  heavy dependencies loaded")
+    for module in STARTUP_MODULES:
+        timings = [measure_import(module) for _ in range(runs)]
+        seconds = [t for t, _ in timings if t is not None]
+        heavy = timings[-1][1]
+        print(f"{module:<20}{f'{min(seconds) * 1000:.0f}ms' if seconds else 'failed':>10}  {', '.join(heavy) or '-'}")
+
+    cli = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "pipeline.py", "--help"], capture_output=True)
+        cli.append(time.perf_counter() - started)
+    print(f"{'pipeline.py --help':<20}{min(cli) * 1000:>8.0f}ms  (whole process)")
+
+    banner("🔌 First-use connections")
+    started = time.perf_counter()
+    try:
+        get_db().command("ping")
+        print(f"{'mongo client + ping':<20}{(time.perf_counter() - started) * 1000:>8.0f}ms")
+    except Exception as e:
+        print(f"{'mongo client + ping':<20}{'failed':>10}  {str(e).split(',')[0]}")
+    started = time.perf_counter()
+    get_session()
+    print(f"{'http session':<20}{(time.perf_counter() - started) * 1000:>8.0f}ms")
 
 # ─── Reset MongoDB ──────────────────────────────────────
 def reset_db():
+    import shutil
+    from snapshot import stamp_collection, snapshot_dir
     esic_col.delete_many({})
     isic_col.delete_many({})
+    # Re-stamp the now empty collections and drop the ISIC snapshot / lexical index built from the old rows
+    for col in [esic_col, isic_col]:
+        stamp_collection(col)
+    shutil.rmtree(snapshot_dir(isic_col.name), ignore_errors=True)
 
     models = [
                             # "nomic-embed-text", 
@@ -99,11 +198,18 @@ def reset_db():
                     "distance": f"embedding_raw_{model}{'_full' if full_text else ''}",
                 }.get(match_mode, f"embedding_cosine_{model}{'_full' if full_text else ''}")
 
-                result_col = db[config["collections"].get(f"results{esic_key}", f"mapping_results{esic_key}")]
-                
-                result_col.delete_many({})
+                get_collection(f"results{esic_key}", f"mapping_results{esic_key}").delete_many({})
     print("🧹 Cleared esic_codes, isic, and mapping_results collections.")
 
+# ─── CLI Options ────────────────────────────────────────
+def get_option(args, name, default=None, cast=str):
+    """Value following `name` in args (e.g. --concurrency 8), or default."""
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            return cast(args[idx + 1])
+    return default
+
 # ─── CLI Dispatcher ─────────────────────────────────────
 def show_help():
     print("""
@@ -114,31 +220,129 @@ Commands:
   loadisic   → Load ISIC Rev. 4 data with full embeddings
   load       → Load ISIC and ESIC
   map        → Perform ESIC-to-ISIC semantic mapping
-  export     → Export results to Excel
+  export     → Export results to Excel, CSV or Parquet
   loadmap    → Run load + loadisic + map
   test       → Test embedding endpoint
   reset      → Clear MongoDB collections
+  cache      → Inspect or prune the embedding cache (stats | prune [N] | clear [model])
+  migrate    → Convert legacy embedding_* float lists to compact Binary vectors
+  snapshot   → Write memory-mapped ISIC vector snapshots for fast startup
+  bench      → Recall@1/3/5/10, MRR, N.th Match histogram and per-stage timings vs a gold file (JSON)
+  reason     → LLM adjudication of stored mapping results (checkpointed, resumable)
+  sweep      → Map every match mode × full-text variant in one pass and compare them
+  recall     → Report recall@k of compressed (int8 / reduced-dimension) tiers vs exact search
+  startup    → Time cold imports, heavy dependencies pulled in, and first Mongo / HTTP connection
+  jobs       → List recent load / map jobs with their checkpointed chunks and status
+
+Options:
+  --concurrency N  → Max in-flight embedding requests for load commands (adaptive)
+  --delta          → Load commands: embed and upsert only new/changed rows, delete removed ones
+  --file PATH      → loadesic / loadisic: read this .xlsx or .csv instead of the default sheet
+  --chunk-size N   → Load commands: rows embedded and inserted per batch (bounds memory)
+  --resume         → load* / map / loadmap: skip chunks checkpointed by an interrupted run of the same job
+  --k N            → Matches per ESIC entry for recall / sweep, match columns for export (default 5)
+  --format F       → export: xlsx (default), csv or parquet; written in streaming batches
+  --beam N         → map: hierarchical section → division → group search keeping N branches per level
+  --retrieval R    → map: dense (default), lexical (TF-IDF only), rerank (lexical shortlist → dense) or fusion
+  --incremental    → map: re-map only ESIC entries whose vector changed (full pass if ISIC changed)
+  --gold PATH      → bench: gold ESIC → ISIC mapping (.xlsx / .csv with ESIC Code, ISIC Code columns)
+  --out PATH       → bench: JSON report path (default output/bench_<timestamp>.json)
+  --fake           → bench: deterministic in-process embeddings instead of Ollama
+  --gen-model M    → reason: generative model (default qwen3:14b)
+  --workers N      → reason: concurrent generation requests (default 2)
+  --margin X       → reason: only entries whose top-1 minus top-2 score is below X
+  --limit N        → reason: stop after N new entries; jobs: number of jobs listed
+  --dims A,B,C     → Reduced dimensions to evaluate for recall (default 128,256,512)
+  --runs N         → startup: repetitions per measurement, best is reported (default 3)
 """)
 
+# ─── Run Metrics ────────────────────────────────────────
+def finish_run(cmd):
+    """Print the per-stage timing table and write the run's metrics as JSON + Prometheus text."""
+    from metrics import METRICS
+    if not METRICS:
+        return
+    banner(f"📊 Metrics for {cmd} ({METRICS.snapshot()['elapsed']:.1f}s)")
+    METRICS.report()
+    path = METRICS.write_summary(cmd)
+    done(f"Metrics written to {path} (+ .prom)")
+
+def run_command(cmd, args):
+    concurrency = get_option(args, "--concurrency", cast=int)
+    delta = "--delta" in args
+    resume = "--resume" in args
+    load_options = {"concurrency": concurrency, "delta": delta, "resume": resume}
+    if "--chunk-size" in args:
+        load_options["chunk_size"] = get_option(args, "--chunk-size", cast=int)
+    filepath = get_option(args, "--file")
+    if cmd == "loadesic": load_esic(filepath or "data/esic_data.xlsx", **load_options)
+    elif cmd == "loadisic": load_isic(filepath or "data/isic_data_r5.xlsx", **load_options)
+    elif cmd == "map":
+        from mapper import RETRIEVAL_MODES
+        beam = get_option(args, "--beam", cast=int)
+        retrieval = get_option(args, "--retrieval")
+        if retrieval is not None and retrieval not in RETRIEVAL_MODES:
+            print(f"❌ Unknown --retrieval {retrieval} (choose from {' | '.join(RETRIEVAL_MODES)})")
+            return
+        map_esic_to_isic(store=True, verbose=True, k_top=5, model="mxbai-embed-large", hierarchical=beam is not None, beam=beam,
+                         incremental="--incremental" in args, retrieval=retrieval, resume=resume)
+    elif cmd == "export":
+        export_results_to_excel(model="mxbai-embed-large", match_mode="cosine", full_text=False,
+                                k=get_option(args, "--k", 5, int), fmt=get_option(args, "--format", "xlsx"))
+    elif cmd == "loadmap":
+        load_esic(**load_options)
+        load_isic(**load_options)
+        map_esic_to_isic(store=True, verbose=True, k_top=5, model="mxbai-embed-large", resume=resume)
+    elif cmd == "load":
+        load_esic(**load_options)
+        load_isic(**load_options)
+    elif cmd == "test": test_embedding()
+    elif cmd == "reset": reset_db()
+    elif cmd == "cache":
+        from embedding_cache import run_cli as run_cache_cli
+        run_cache_cli(args[1:])
+    elif cmd == "migrate": migrate_vectors()
+    elif cmd == "snapshot": snapshot_isic()
+    elif cmd == "bench":
+        gold = get_option(args, "--gold")
+        if not gold:
+            print("❌ bench needs a gold mapping file: --gold PATH (ESIC Code, ISIC Code columns)")
+        else:
+            from bench import run_bench
+            run_bench(gold, k=get_option(args, "--k", 10, int), out=get_option(args, "--out"),
+                      backend="fake" if "--fake" in args else None)
+    elif cmd == "reason":
+        from generative_mapper import reason_over_results
+        reason_over_results(
+            gen_model=get_option(args, "--gen-model", "qwen3:14b"),
+            top_k=get_option(args, "--k", 5, int),
+            workers=get_option(args, "--workers", 2, int),
+            margin=get_option(args, "--margin", cast=float),
+            limit=get_option(args, "--limit", cast=int),
+        )
+    elif cmd == "sweep": run_sweep(k=get_option(args, "--k", 5, int))
+    elif cmd == "recall":
+        report_recall(
+            k=get_option(args, "--k", 5, int),
+            dims_options=get_option(args, "--dims", (128, 256, 512), lambda v: [int(d) for d in v.split(",")]),
+        )
+    elif cmd == "startup": report_startup(runs=get_option(args, "--runs", 3, int))
+    elif cmd == "jobs":
+        from jobs import list_jobs
+        list_jobs(limit=get_option(args, "--limit", 20, int))
+    else:
+        print(f"❌ Unknown command: {cmd}")
+        show_help()
+
 if __name__ == "__main__":
     args = sys.argv[1:]
     if not args or args[0] in ["--help", "-h"]:
         show_help()
     else:
         cmd = args[0].lower()
-        if cmd == "loadesic": load_esic()
-        elif cmd == "loadisic": load_isic()
-        elif cmd == "map": map_esic_to_isic(store=True, verbose=True, k_top=5, model="mxbai-embed-large")
-        elif cmd == "export": export_results_to_excel(model="mxbai-embed-large", match_mode="cosine", full_text=False)
-        elif cmd == "loadmap":
-            load_esic()
-            load_isic()
-            map_esic_to_isic(store=True, verbose=True, k_top=5, model="mxbai-embed-large")
-        elif cmd == "load":
-            load_esic()
-            load_isic()
-        elif cmd == "test": test_embedding()
-        elif cmd == "reset": reset_db()
-        else:
-            print(f"❌ Unknown command: {cmd}")
-            show_help()
+        try:
+            run_command(cmd, args)
+        finally:
+            # Written even when a run fails, so the summary shows where the time went before it stopped
+            if cmd not in ("startup", "cache"):
+                finish_run(cmd)
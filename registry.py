@@ -0,0 +1,109 @@
+# File: registry.py
+
+import os
+import threading
+import yaml
+from dotenv import load_dotenv
+
+# ─── Process-Wide Config and Connections ─────────────────────
+# config.yaml is read once, and the Mongo client and HTTP session are created on first use,
+# so commands and Streamlit reruns only pay for the connections they actually touch.
+CONFIG_PATH = os.getenv("CONFIG_PATH", "config.yaml")
+DB_NAME     = os.getenv("MONGO_DB", "industry_mapping")
+
+_lock = threading.RLock()
+_db_name = DB_NAME
+_config = None
+_client = None
+_session = None
+_collections = {}
+
+def get_config():
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                load_dotenv()
+                with open(CONFIG_PATH, "r") as f:
+                    _config = yaml.safe_load(f)
+    return _config
+
+def get_client():
+    """One pooled MongoClient per process (pymongo is imported on first call)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from pymongo import MongoClient
+                from metrics import mongo_listeners
+                config = get_config()
+                mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
+                _client = MongoClient(mongo_uri, maxPoolSize=int(config.get("mongo_pool_size", 100)),
+                                      event_listeners=mongo_listeners())
+    return _client
+
+def get_db():
+    return get_client()[_db_name]
+
+def get_db_name():
+    return _db_name
+
+def use_database(name):
+    """Point every collection (lazy ones included) at another database; returns the previous name."""
+    global _db_name
+    with _lock:
+        previous, _db_name = _db_name, name
+        _collections.clear()
+    return previous
+
+def get_collection(key, default=None):
+    """Collection named by config["collections"][key], else `default` (or the key itself)."""
+    name = get_config()["collections"].get(key, default or key)
+    if name not in _collections:
+        _collections[name] = get_db()[name]
+    return _collections[name]
+
+class LazyCollection:
+    """Module-level stand-in for a collection; connects on first attribute access."""
+
+    def __init__(self, key, default=None):
+        self._key = key
+        self._default = default
+
+    def resolve(self):
+        return get_collection(self._key, self._default)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __getitem__(self, name):
+        return self.resolve()[name]
+
+    def __repr__(self):
+        return f"LazyCollection({self._key!r})"
+
+def get_session():
+    """One keep-alive requests.Session shared by embedding and generation calls."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import requests
+                embedding_config = get_config().get("embedding", {})
+                pool_size = max(16, int(os.getenv("EMBED_CONCURRENCY", embedding_config.get("concurrency", 1))))
+                session = requests.Session()
+                session.headers.update({"Connection": "keep-alive"})
+                session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+                session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+                _session = session
+    return _session
+
+def close_connections():
+    global _client, _session
+    with _lock:
+        if _client is not None:
+            _client.close()
+        if _session is not None:
+            _session.close()
+        _client, _session = None, None
+        _collections.clear()
@@ -0,0 +1,140 @@
+# File: request_executor.py
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import METRICS
+
+# ─── AIMD Concurrency Controller ─────────────────────────────
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    The limit grows by one after a full window of healthy responses and is cut
+    by `decrease` on an error or when latency exceeds `tolerance` x the best
+    smoothed latency seen so far.
+    """
+
+    def __init__(self, max_limit, start=1, decrease=0.5, tolerance=2.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = max(1, min(start, self.max_limit))
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self._ewma = None
+        self._baseline = None
+        self._healthy = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, ok):
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self._ewma = latency if self._ewma is None else 0.8 * self._ewma + 0.2 * latency
+                self._baseline = self._ewma if self._baseline is None else min(self._baseline, self._ewma)
+            if not ok or self._ewma > self.tolerance * self._baseline:
+                self.limit = max(1, int(self.limit * self.decrease))
+                self._healthy = 0
+            else:
+                self._healthy += 1
+                if self._healthy >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.peak_limit = max(self.peak_limit, self.limit)
+                    self._healthy = 0
+            self._cond.notify_all()
+
+# ─── Fixed Concurrency Limit ─────────────────────────────────
+class FixedLimit:
+    """Plain in-flight cap with the controller interface, for requests whose latency varies by design."""
+
+    def __init__(self, limit):
+        self.limit = self.peak_limit = max(1, limit)
+        self._slots = threading.Semaphore(self.limit)
+
+    def acquire(self):
+        self._slots.acquire()
+
+    def release(self, latency, ok):
+        self._slots.release()
+
+# ─── Bounded-Concurrency Executor ────────────────────────────
+class RequestExecutor:
+    """Runs request callables on a thread pool with retries, gated by an AIMD controller.
+
+    `adaptive=False` keeps a fixed limit instead: generation latency grows with the answer
+    length, so the AIMD latency trigger would throttle it on ordinary variance. Every attempt
+    is recorded under `name` in the metrics registry (latency histogram, request / error /
+    retry counters).
+    """
+
+    def __init__(self, concurrency=4, retries=3, backoff=0.5, name="embed", adaptive=True):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.controller = (AIMDController(self.concurrency, start=min(2, self.concurrency))
+                           if adaptive else FixedLimit(self.concurrency))
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _call(self, fn, item):
+        for attempt in range(self.retries + 1):
+            self.controller.acquire()
+            start = time.time()
+            try:
+                result = fn(item)
+                latency = time.time() - start
+                self.controller.release(latency, ok=True)
+                METRICS.observe(f"{self.name}_request_seconds", latency)
+                with self._lock:
+                    self.requests += 1
+                return result
+            except Exception:
+                latency = time.time() - start
+                self.controller.release(latency, ok=False)
+                METRICS.observe(f"{self.name}_request_seconds", latency)
+                METRICS.inc(f"{self.name}_errors_total")
+                with self._lock:
+                    self.requests += 1
+                    self.errors += 1
+                    if attempt < self.retries:
+                        self.retried += 1
+                if attempt >= self.retries:
+                    raise
+                METRICS.inc(f"{self.name}_retries_total")
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def map(self, fn, items, on_done=None):
+        """Apply fn to every item; results (or the raised exception) come back in input order."""
+        items = list(items)
+        results = [None] * len(items)
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._call, fn, item): i for i, item in enumerate(items)}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = e
+                if on_done:
+                    on_done(completed, len(items))
+        self.elapsed += time.time() - started
+        return results
+
+    def summary(self):
+        rate = self.requests / self.elapsed if self.elapsed > 0 else 0.0
+        return (
+            f"{self.requests} requests in {self.elapsed:.1f}s ({rate:.1f} req/s), "
+            f"{self.errors} errors, {self.retried} retries, peak concurrency {self.controller.peak_limit}"
+        )
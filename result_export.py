@@ -0,0 +1,135 @@
+# File: result_export.py
+
+import os
+import csv
+import time
+from logger import banner, progress, done
+from metrics import METRICS
+
+BATCH_SIZE = 1000
+FORMATS    = {"xlsx": ".xlsx", "csv": ".csv", "parquet": ".parquet"}
+
+# ─── Row Layout ──────────────────────────────────────────────
+def result_headers(k):
+    headers = ["ESIC Code", "Title of Category"]
+    for i in range(k):
+        headers += [
+            f"Match {i+1} ISIC Code",
+            f"Match {i+1} ISIC Description",
+            f"Match {i+1} Score"
+        ]
+    return headers
+
+def result_row(record, k):
+    """Flatten one mapping result into k (code, description, score) blocks, padding short lists."""
+    row = [record.get("esic_code", ""), record.get("title", "")]
+    matches = record.get("matches", [])[:k]
+    for match in matches:
+        row += [match.get("full_code", ""), match.get("description", ""), match.get("score", 0.0)]
+    row += [None] * (3 * (k - len(matches)))
+    return row
+
+# ─── Streaming Writers ───────────────────────────────────────
+class ExcelWriter:
+    def __init__(self, path, headers):
+        import xlsxwriter
+        # constant_memory flushes each row to disk as soon as the next one starts
+        self.wb = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self.ws = self.wb.add_worksheet("ESIC-ISIC Mapping")
+        self.ws.write_row(0, 0, headers)
+        self.row = 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.ws.write_row(self.row, 0, row)
+            self.row += 1
+
+    def close(self):
+        self.wb.close()
+
+class CsvWriter:
+    def __init__(self, path, headers):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(headers)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class ParquetWriter:
+    """One Parquet row group per cursor batch; needs pyarrow."""
+    def __init__(self, path, headers):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.headers = headers
+        self.schema = pa.schema([
+            (h, pa.float64() if h.endswith("Score") else pa.string()) for h in headers
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        columns = [list(col) for col in zip(*rows)] if rows else [[] for _ in self.headers]
+        columns = [
+            col if field.type == self.pa.float64() else [None if v is None else str(v) for v in col]
+            for field, col in zip(self.schema, columns)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"xlsx": ExcelWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+# ─── Export ──────────────────────────────────────────────────
+def check_format(fmt):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt} (choose from {', '.join(WRITERS)})")
+
+def export_collection(result_col, path, k, fmt="xlsx", batch_size=BATCH_SIZE, transform=None):
+    """Stream a mapping-result collection to xlsx / csv / parquet in cursor batches.
+
+    Only `batch_size` results are held at once, so memory is flat in the collection size.
+    `transform` may rewrite each batch before flattening (e.g. to join ISIC labels).
+    """
+    check_format(fmt)
+    total = result_col.count_documents({})
+    banner(f"📤 Exporting {total} mappings to {path}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    started = time.time()
+    writer = WRITERS[fmt](path, result_headers(k))
+    cursor = result_col.find({}, {"_id": 0, "esic_code": 1, "title": 1, "matches": 1}).batch_size(batch_size)
+    written, batch = 0, []
+    try:
+        for record in cursor:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                written += _flush(writer, batch, k, transform, fmt)
+                batch = []
+                progress(written, total, prefix=f"▶ {fmt.upper()} Export")
+        if batch:
+            written += _flush(writer, batch, k, transform, fmt)
+            progress(written, total, prefix=f"▶ {fmt.upper()} Export")
+    finally:
+        writer.close()
+    print()
+
+    elapsed = time.time() - started
+    done(f"Exported {written} rows to {path} in {elapsed:.2f}s ({written / max(elapsed, 1e-9):.0f} rows/s)")
+    return written
+
+def _flush(writer, batch, k, transform, fmt):
+    if transform:
+        with METRICS.timer("export_transform_seconds"):
+            batch = transform(batch)
+    with METRICS.timer("export_write_seconds", format=fmt):
+        writer.write_rows([result_row(record, k) for record in batch])
+    METRICS.inc("export_rows_total", len(batch))
+    return len(batch)
@@ -0,0 +1,55 @@
+# File: sheet_reader.py
+
+import os
+import csv
+from utils import safe_str
+
+# ─── Streaming Row Readers ───────────────────────────────────
+def open_rows(filepath):
+    """(header, total, rows) for an .xlsx or .csv file without loading it into memory.
+
+    `rows` is a generator of value tuples; `total` is the data-row count when the file
+    declares it (xlsx dimensions) and None otherwise.
+    """
+    if os.path.splitext(filepath)[1].lower() == ".csv":
+        return _open_csv(filepath)
+    return _open_xlsx(filepath)
+
+def _open_xlsx(filepath):
+    import openpyxl
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    sheet = wb.active
+    rows = sheet.iter_rows(values_only=True)
+    header = [safe_str(v) for v in next(rows, ())]
+    total = sheet.max_row - 1 if sheet.max_row else None
+
+    def generate():
+        try:
+            for row in rows:
+                # Read-only sheets drop trailing empty cells; pad so header indices stay valid
+                yield tuple(row) + (None,) * (len(header) - len(row))
+        finally:
+            wb.close()
+    return header, total, generate()
+
+def _open_csv(filepath):
+    f = open(filepath, newline="", encoding="utf-8-sig")
+    reader = csv.reader(f)
+    header = [safe_str(v) for v in next(reader, [])]
+
+    def generate():
+        with f:
+            for row in reader:
+                yield tuple(v if v != "" else None for v in row) + (None,) * (len(header) - len(row))
+    return header, None, generate()
+
+def chunked(items, size):
+    """Yield lists of at most `size` items from any iterable."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,126 @@
+# File: snapshot.py
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import bson
+from registry import get_config, get_db_name, DB_NAME
+from vector_index import VectorIndex, META_FIELDS, partition_key
+from vector_store import projection
+
+# ─── Load Config ─────────────────────────────────────────────
+config = get_config()
+
+snapshot_config = config.get("snapshot", {})
+SNAPSHOT_DIR    = os.getenv("SNAPSHOT_DIR", snapshot_config.get("dir", "snapshots"))
+META_COLLECTION = config["collections"].get("meta", "collection_meta")
+MATCH_MODES     = ["cosine", "dotProduct", "distance"]
+
+# ─── Collection Fingerprints ─────────────────────────────────
+def fingerprint_collection(collection):
+    """sha256 over the per-document content hashes (order-independent, ignores _id)."""
+    digests = []
+    for doc in collection.find({}):
+        doc.pop("_id", None)
+        digests.append(hashlib.sha256(bson.encode(doc)).hexdigest())
+    digest = hashlib.sha256()
+    for d in sorted(digests):
+        digest.update(d.encode())
+    return digest.hexdigest()[:16], len(digests)
+
+def collection_marker(collection):
+    """(document count, newest _id): two cheap reads that change with any insert or delete."""
+    newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return collection.estimated_document_count(), newest["_id"] if newest else None
+
+def stamp_collection(collection):
+    """Recompute and record the collection's fingerprint; call after every write pass."""
+    fingerprint, count = fingerprint_collection(collection)
+    _, max_id = collection_marker(collection)
+    collection.database[META_COLLECTION].update_one(
+        {"_id": collection.name},
+        {"$set": {"fingerprint": fingerprint, "count": count, "max_id": max_id, "updated_at": time.time()}},
+        upsert=True,
+    )
+    return fingerprint
+
+def get_fingerprint(collection):
+    """Recorded fingerprint, re-stamped when the live count or newest _id no longer match the stamp.
+
+    Writes made outside the loaders (a reset, a manual insert / delete) therefore invalidate
+    snapshots and cached indexes; in-place updates still need a stamp_collection call.
+    """
+    meta = collection.database[META_COLLECTION].find_one({"_id": collection.name})
+    if meta and meta.get("fingerprint") and (meta.get("count"), meta.get("max_id")) == collection_marker(collection):
+        return meta["fingerprint"]
+    return stamp_collection(collection)
+
+# ─── Snapshot Files ──────────────────────────────────────────
+def variant_name(model, match_mode, full_text=False):
+    return f"{model}_{match_mode}{'_full' if full_text else ''}"
+
+def snapshot_dir(collection_name):
+    """Per-collection directory; collections of another database (e.g. the bench's) get their own subtree."""
+    if get_db_name() != DB_NAME:
+        return os.path.join(SNAPSHOT_DIR, get_db_name(), collection_name)
+    return os.path.join(SNAPSHOT_DIR, collection_name)
+
+def meta_path(collection_name, model):
+    return os.path.join(snapshot_dir(collection_name), f"{model}.meta.json")
+
+def matrix_path(collection_name, model, match_mode, full_text=False):
+    return os.path.join(snapshot_dir(collection_name), f"{variant_name(model, match_mode, full_text)}.npy")
+
+def write_snapshot(collection, model):
+    """Write every mode / text-span matrix for one model plus a shared metadata sidecar.
+
+    Rows are ordered by partition_key (level, section_label, sort_order) and matrices are stored in
+    the mode's space, so they can be memory-mapped and searched without conversion.
+    """
+    fingerprint = get_fingerprint(collection)
+    fields = {f: 1 for f in META_FIELDS}
+    for full_text in (False, True):
+        for match_mode in MATCH_MODES:
+            fields.update(projection(model, match_mode, full_text))
+    docs = list(collection.find({}, fields))
+
+    os.makedirs(snapshot_dir(collection.name), exist_ok=True)
+    rows, variants = None, []
+    for full_text in (False, True):
+        for match_mode in MATCH_MODES:
+            index = VectorIndex.from_documents(docs, model, match_mode, full_text)
+            order = sorted(range(len(index)), key=lambda i: partition_key(index.meta[i]))
+            meta = [index.meta[i] for i in order]
+            if rows is None:
+                rows = meta
+            elif [m.get("full_code") for m in meta] != [m.get("full_code") for m in rows]:
+                continue
+            np.save(matrix_path(collection.name, model, match_mode, full_text), index.matrix[order])
+            variants.append(variant_name(model, match_mode, full_text))
+
+    with open(meta_path(collection.name, model), "w") as f:
+        json.dump({
+            "collection": collection.name,
+            "model": model,
+            "fingerprint": fingerprint,
+            "created_at": time.time(),
+            "variants": variants,
+            "rows": rows or [],
+        }, f, default=str)
+    return fingerprint, len(rows or []), variants
+
+def load_snapshot(collection, model, match_mode, full_text=False, fingerprint=None):
+    """Memory-mapped VectorIndex, or None when missing or stale against `fingerprint`."""
+    path = matrix_path(collection.name, model, match_mode, full_text)
+    if not os.path.exists(path) or not os.path.exists(meta_path(collection.name, model)):
+        return None
+    with open(meta_path(collection.name, model)) as f:
+        meta = json.load(f)
+    if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+        return None
+    if variant_name(model, match_mode, full_text) not in meta.get("variants", []):
+        return None
+    matrix = np.load(path, mmap_mode="r")
+    return VectorIndex(matrix, meta["rows"], match_mode, prepared=True)
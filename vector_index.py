@@ -0,0 +1,399 @@
+# File: vector_index.py
+
+import numpy as np
+from vector_store import derive_vector, projection
+
+# ─── Metadata Kept Alongside Each Vector ─────────────────────────
+META_FIELDS = [
+    "code",
+    "full_code",
+    "description",
+    "section",
+    "section_label",
+    "division",
+    "division_label",
+    "group",
+    "group_label",
+    "class",
+    "level",
+    "sort_order",
+]
+
+# ─── Row Helpers ─────────────────────────────────────────────────
+def l2_normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def top_k_rows(scores, k):
+    """Row-wise top-k over a 2-D score block: (indices, scores), best first per row."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first (partial selection, no full sort)."""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+# Field a level-L row shares with its parent at level L-1 (section → division → group → class)
+PARENT_FIELDS = {2: "section", 3: "division", 4: "group"}
+
+def partition_key(meta):
+    """Row order that makes every level and every (level, section) a contiguous row range."""
+    level = meta.get("level")
+    return (
+        level if isinstance(level, (int, float)) else float("inf"),
+        str(meta.get("section_label") or ""),
+        meta.get("sort_order") if isinstance(meta.get("sort_order"), (int, float)) else 0,
+    )
+
+# ─── Resident ISIC Vector Index ──────────────────────────────────
+class VectorIndex:
+    """Contiguous float32 matrix of ISIC vectors plus a parallel metadata list.
+
+    Rows are stored in the space of the match mode: unit-length for cosine,
+    as-is for dotProduct and distance (with squared norms cached for the latter).
+    """
+
+    def __init__(self, matrix, meta, match_mode="cosine", prepared=False, sq_norms=None):
+        """`prepared=True` means rows are already in the mode's space (e.g. a snapshot)."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(meta), -1)
+        if match_mode == "cosine" and not prepared:
+            matrix = l2_normalize_rows(matrix)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.meta = list(meta)
+        self.match_mode = match_mode
+        if sq_norms is None and match_mode == "distance":
+            sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.sq_norms = sq_norms
+        self._level_rows = None
+        self._children = {}
+        self._offsets = None
+        self._partitions = {}
+
+    def __len__(self):
+        return len(self.meta)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    # ── Build from MongoDB ───────────────────────────────────────
+    @classmethod
+    def from_documents(cls, docs, model, match_mode="cosine", full_text=False):
+        vectors, meta = [], []
+        for doc in docs:
+            vec = derive_vector(doc, model, match_mode, full_text)
+            if vec is None:
+                continue
+            vectors.append(vec)
+            meta.append({f: doc.get(f) for f in META_FIELDS})
+
+        if not vectors:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], match_mode)
+
+        # Failed embeddings fall back to a default-length zero vector; drop rows
+        # whose dimension disagrees with the model's.
+        lengths = [len(v) for v in vectors]
+        dim = max(set(lengths), key=lengths.count)
+        keep = [i for i, n in enumerate(lengths) if n == dim]
+        matrix = np.stack([vectors[i] for i in keep]).astype(np.float32, copy=False)
+        return cls(matrix, [meta[i] for i in keep], match_mode)
+
+    @classmethod
+    def from_collection(cls, collection, model, match_mode="cosine", full_text=False, query_filter=None):
+        fields = {**projection(model, match_mode, full_text), **{f: 1 for f in META_FIELDS}}
+        return cls.from_documents(collection.find(query_filter or {}, fields), model, match_mode, full_text)
+
+    # ── Filtering ────────────────────────────────────────────────
+    def subset(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        sq_norms = self.sq_norms[rows] if self.sq_norms is not None else None
+        return VectorIndex(self.matrix[rows], [self.meta[i] for i in rows], self.match_mode, prepared=True, sq_norms=sq_norms)
+
+    def view(self, start, end):
+        """Zero-copy index over the contiguous row range [start, end)."""
+        sq_norms = self.sq_norms[start:end] if self.sq_norms is not None else None
+        return VectorIndex(self.matrix[start:end], self.meta[start:end], self.match_mode, prepared=True, sq_norms=sq_norms)
+
+    def filter(self, level=None, section=None):
+        """Rows at an ISIC level and, optionally, within a section label."""
+        rows = [
+            i for i, m in enumerate(self.meta)
+            if (level is None or m.get("level") == level) and (section is None or m.get("section_label") == section)
+        ]
+        return self.subset(rows)
+
+    # ── Level / Section Partitions ───────────────────────────────
+    def partitioned(self):
+        """This index with rows sorted by partition_key (a copy only if they are not already)."""
+        keys = [partition_key(m) for m in self.meta]
+        if all(a <= b for a, b in zip(keys, keys[1:])):
+            return self
+        return self.subset(sorted(range(len(self)), key=keys.__getitem__))
+
+    def offsets(self):
+        """Offset table {(level, None) | (level, section_label): (start, end)} over sorted rows."""
+        if self._offsets is None:
+            offsets = {}
+            for i, m in enumerate(self.meta):
+                for key in ((m.get("level"), None), (m.get("level"), m.get("section_label"))):
+                    start, _ = offsets.get(key, (i, i))
+                    offsets[key] = (start, i + 1)
+            self._offsets = offsets
+        return self._offsets
+
+    def partition(self, level=None, section=None):
+        """Level / section slice served as a view when rows are partition-sorted, else filtered."""
+        key = (level, section)
+        if key not in self._partitions:
+            if level is None:
+                self._partitions[key] = self.filter(level, section)
+            else:
+                start, end = self.offsets().get(key, (0, 0))
+                part = self.view(start, end)
+                if any(m.get("level") != level or (section is not None and m.get("section_label") != section) for m in part.meta):
+                    part = self.filter(level, section)
+                self._partitions[key] = part
+        return self._partitions[key]
+
+    # ── Scoring ──────────────────────────────────────────────────
+    def _prepare_query(self, vec):
+        q = np.asarray(vec, dtype=np.float32).ravel()
+        if self.match_mode == "cosine":
+            norm = np.linalg.norm(q)
+            q = q / norm if norm > 0 else q
+        return q
+
+    def prepare_queries(self, queries):
+        Q = np.asarray(queries, dtype=np.float32)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        return l2_normalize_rows(Q) if self.match_mode == "cosine" else Q
+
+    def scores(self, vec):
+        q = self._prepare_query(vec)
+        if len(self) == 0 or q.shape[0] != self.dim:
+            return np.zeros(len(self), dtype=np.float32)
+        dots = self.matrix @ q
+        if self.match_mode == "distance":
+            sq = np.maximum(self.sq_norms - 2.0 * dots + float(q @ q), 0.0)
+            return 1.0 / (1.0 + np.sqrt(sq))
+        return dots
+
+    def score_block(self, queries):
+        """Score a block of queries against every row with a single GEMM."""
+        Q = self.prepare_queries(queries)
+        dots = Q @ self.matrix.T
+        if self.match_mode == "distance":
+            return dots_to_distance_scores(dots, np.einsum("ij,ij->i", Q, Q), self.sq_norms)
+        return dots
+
+    def score_candidates(self, queries, candidates):
+        """Exact scores of each query against its own candidate rows (b x m)."""
+        Q = self.prepare_queries(queries)
+        rows = self.matrix[candidates]
+        dots = np.einsum("bmd,bd->bm", rows, Q)
+        if self.match_mode == "distance":
+            return dots_to_distance_scores(dots, np.einsum("ij,ij->i", Q, Q), self.sq_norms[candidates])
+        return dots
+
+    def format_matches(self, row_idx, row_scores):
+        return [{**self.meta[i], "score": round(float(s), 3)} for i, s in zip(row_idx, row_scores)]
+
+    def search_batch(self, queries, k=3, chunk_size=256):
+        """Top-k for many queries, scoring chunk_size rows of the query matrix at a time.
+
+        Peak extra memory is chunk_size x len(index) floats regardless of query count.
+        """
+        Q = np.asarray(queries, dtype=np.float32)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        k = len(self) if k is None else k
+        results = []
+        if len(self) == 0 or Q.shape[1] != self.dim:
+            return [[] for _ in range(Q.shape[0])]
+        chunk_size = max(1, int(chunk_size or Q.shape[0]))
+        for start in range(0, Q.shape[0], chunk_size):
+            idx, top = top_k_rows(self.score_block(Q[start:start + chunk_size]), k)
+            results.extend(self.format_matches(i, s) for i, s in zip(idx, top))
+        return results
+
+    def search(self, vec, k=3):
+        scores = self.scores(vec)
+        k = len(self) if k is None else k
+        top = top_k_indices(scores, k)
+        return self.format_matches(top, scores[top])
+
+    # ── Hierarchical Coarse-to-Fine Search ───────────────────────
+    def rows_at_level(self, level):
+        if self._level_rows is None:
+            levels = {}
+            for i, m in enumerate(self.meta):
+                levels.setdefault(m.get("level"), []).append(i)
+            self._level_rows = {lvl: np.asarray(rows, dtype=np.int64) for lvl, rows in levels.items()}
+        return self._level_rows.get(level, np.empty(0, dtype=np.int64))
+
+    def children(self, level, value):
+        """Rows at `level` whose parent-link field (see PARENT_FIELDS) equals value."""
+        if level not in self._children:
+            field = PARENT_FIELDS.get(level)
+            groups = {}
+            for i in self.rows_at_level(level):
+                groups.setdefault(self.meta[i].get(field) if field else None, []).append(int(i))
+            self._children[level] = groups
+        return self._children[level].get(value, [])
+
+    def score_rows(self, vec, rows):
+        q = self._prepare_query(vec)
+        if len(rows) == 0 or q.shape[0] != self.dim:
+            return np.zeros(len(rows), dtype=np.float32)
+        dots = self.matrix[rows] @ q
+        if self.match_mode == "distance":
+            return dots_to_distance_scores(dots[None, :], np.array([q @ q]), self.sq_norms[rows])[0]
+        return dots
+
+    def search_hierarchical(self, vec, k=3, beam=3, start_level=1, target_level=4, section=None):
+        """Beam search down the ISIC tree: keep the best `beam` nodes per level, descend only into
+        their children, and return the top-k nodes at target_level, each with its ancestor path.
+        """
+        rows = self.rows_at_level(start_level)
+        if section is not None:
+            rows = rows[[self.meta[i].get("section_label") == section for i in rows]] if len(rows) else rows
+        paths = {int(i): [] for i in rows}
+
+        for level in range(start_level, target_level + 1):
+            scores = self.score_rows(vec, rows)
+            width = k if level == target_level else beam
+            top = top_k_indices(scores, width)
+            kept = rows[top]
+            if level == target_level:
+                return [
+                    {**self.meta[i], "score": round(float(s), 3), "path": paths[int(i)]}
+                    for i, s in zip(kept, scores[top])
+                ]
+
+            field = PARENT_FIELDS.get(level + 1)
+            children, child_paths = [], {}
+            for i, s in zip(kept, scores[top]):
+                node = self.meta[i]
+                step = {"level": node.get("level"), "full_code": node.get("full_code"),
+                        "description": node.get("description"), "score": round(float(s), 3)}
+                for c in self.children(level + 1, node.get(field)):
+                    if c not in child_paths:
+                        children.append(c)
+                        child_paths[c] = paths[int(i)] + [step]
+            rows = np.asarray(children, dtype=np.int64)
+            paths = child_paths
+        return []
+
+    def compress(self, dims=None, method="truncate", quantize=True):
+        return CompressedTier(self, dims, method, quantize)
+
+def dots_to_distance_scores(dots, q_sq, x_sq):
+    """1 / (1 + euclidean) from dot products via |q|^2 + |x|^2 - 2 q.x."""
+    x_sq = x_sq[None, :] if x_sq.ndim == 1 else x_sq
+    sq = np.maximum(q_sq[:, None] + x_sq - 2.0 * dots, 0.0)
+    return 1.0 / (1.0 + np.sqrt(sq))
+
+# ─── Compressed Search Tier ──────────────────────────────────────
+class CompressedTier:
+    """Shortlist on reduced / int8-quantized vectors, then re-rank with the full index.
+
+    method="truncate" keeps the leading `dims` components (Matryoshka-style, re-normalized
+    for cosine); method="pca" projects onto the top `dims` right singular vectors of the
+    index matrix. With quantize=True each reduced dimension is stored as symmetric int8.
+    """
+
+    def __init__(self, index, dims=None, method="truncate", quantize=True):
+        self.index = index
+        self.method = method
+        self.quantize = quantize
+        self.dims = min(dims or index.dim, index.dim) if len(index) else 0
+        self.projection = None
+        if method == "pca" and len(index) and self.dims < index.dim:
+            _, _, vt = np.linalg.svd(np.asarray(index.matrix, dtype=np.float32), full_matrices=False)
+            self.projection = np.ascontiguousarray(vt[:self.dims].T, dtype=np.float32)
+
+        reduced = self.reduce(index.matrix) if len(index) else np.zeros((0, 0), dtype=np.float32)
+        if quantize and reduced.size:
+            self.scale = np.maximum(np.abs(reduced).max(axis=0), 1e-12) / 127.0
+            self.codes = np.clip(np.rint(reduced / self.scale), -127, 127).astype(np.int8)
+            reconstructed = self.codes * self.scale
+        else:
+            self.scale = None
+            self.codes = np.ascontiguousarray(reduced, dtype=np.float32)
+            reconstructed = self.codes
+        self.sq_norms = np.einsum("ij,ij->i", reconstructed, reconstructed) if reduced.size else np.zeros(0)
+
+    def reduce(self, matrix):
+        M = np.asarray(matrix, dtype=np.float32)
+        if self.projection is not None:
+            return M @ self.projection
+        M = M[:, :self.dims]
+        if self.index.match_mode == "cosine" and self.dims < self.index.dim:
+            M = l2_normalize_rows(M)
+        return M
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.projection.nbytes if self.projection is not None else 0)
+
+    def approximate_scores(self, queries):
+        Q = self.reduce(self.index.prepare_queries(queries))
+        dots = (Q * self.scale) @ self.codes.T if self.scale is not None else Q @ self.codes.T
+        if self.index.match_mode == "distance":
+            return dots_to_distance_scores(dots, np.einsum("ij,ij->i", Q, Q), self.sq_norms)
+        return dots
+
+    def search_batch(self, queries, k=3, chunk_size=256, oversample=4):
+        Q = np.asarray(queries, dtype=np.float32)
+        if Q.ndim == 1:
+            Q = Q.reshape(1, -1)
+        index = self.index
+        k = len(index) if k is None else k
+        if len(index) == 0 or Q.shape[1] != index.dim:
+            return [[] for _ in range(Q.shape[0])]
+        shortlist = max(k, int(k * oversample))
+        results = []
+        chunk_size = max(1, int(chunk_size or Q.shape[0]))
+        for start in range(0, Q.shape[0], chunk_size):
+            block = Q[start:start + chunk_size]
+            candidates, _ = top_k_rows(self.approximate_scores(block), shortlist)
+            exact = index.score_candidates(block, candidates)
+            order, top = top_k_rows(exact, k)
+            rows = np.take_along_axis(candidates, order, axis=1)
+            results.extend(index.format_matches(i, s) for i, s in zip(rows, top))
+        return results
+
+    def search(self, vec, k=3, oversample=4):
+        return self.search_batch(vec, k, oversample=oversample)[0]
+
+# ─── Recall Against the Exact Path ───────────────────────────────
+def recall_at_k(index, tier, queries, k=5, oversample=4, chunk_size=256):
+    """Mean fraction of the exact top-k (by full_code) recovered by the compressed tier."""
+    exact = index.search_batch(queries, k, chunk_size)
+    approx = tier.search_batch(queries, k, chunk_size, oversample)
+    hits = [
+        len({m["full_code"] for m in e} & {m["full_code"] for m in a}) / max(1, len(e))
+        for e, a in zip(exact, approx)
+    ]
+    return float(np.mean(hits)) if hits else 0.0
@@ -0,0 +1,121 @@
+# File: vector_store.py
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+# ─── Compact Field Layout ────────────────────────────────────────
+# One raw float32 vector per embedded text, stored as BSON Binary:
+#   vec_{model}        short text (ESIC title / ISIC description)
+#   vec_{model}_full   ISIC description + inclusion note (absent when identical to the short text)
+#   vec_{model}_neg    ISIC exclusion note (absent when there is none)
+#   norms_{model}      {"short": |v|, "full": |v|, "neg": |v|}, optional
+# Normalized / adjusted variants are derived when vectors are loaded into an index.
+
+def vec_field(model, part="short"):
+    return f"vec_{model}" if part == "short" else f"vec_{model}_{part}"
+
+def norms_field(model):
+    return f"norms_{model}"
+
+def legacy_field(model, match_mode, full_text=False):
+    prefix = {"cosine": "embedding_cosine", "dotProduct": "embedding_dot", "distance": "embedding_raw"}.get(match_mode, "embedding_cosine")
+    return f"{prefix}_{model}{'_full' if full_text else ''}"
+
+# ─── Packing ─────────────────────────────────────────────────────
+def pack_vector(vec):
+    return Binary(np.asarray(vec, dtype="<f4").tobytes())
+
+def unpack_vector(value):
+    """float32 array from a stored Binary/bytes value or a legacy float list; None if empty."""
+    if value is None or len(value) == 0:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
+
+def compact_fields(model, raw, raw_full=None, raw_neg=None, store_norms=True):
+    """Document fields for one model's raw vectors; missing vectors are simply omitted."""
+    fields, norms = {}, {}
+    for part, vec in (("short", raw), ("full", raw_full), ("neg", raw_neg)):
+        if vec is None or len(vec) == 0:
+            continue
+        fields[vec_field(model, part)] = pack_vector(vec)
+        norms[part] = float(np.linalg.norm(np.asarray(vec, dtype=np.float32)))
+    if store_norms and norms:
+        fields[norms_field(model)] = norms
+    return fields
+
+def projection(model, match_mode, full_text=False):
+    fields = [vec_field(model), norms_field(model), legacy_field(model, match_mode, full_text)]
+    if full_text:
+        fields += [vec_field(model, "full"), vec_field(model, "neg")]
+    return {f: 1 for f in fields}
+
+# ─── Derivation ──────────────────────────────────────────────────
+def _unit(vec, norm=None):
+    norm = float(np.linalg.norm(vec)) if norm is None else norm
+    return vec / norm if norm > 0 else vec
+
+def derive_vector(doc, model, match_mode, full_text=False):
+    """Vector for a match mode from a compact document (falling back to legacy list fields).
+
+    cosine / dotProduct use unit-length vectors, distance the raw ones; the full-text
+    variant subtracts the exclusion-note vector from the full-text vector.
+    """
+    raw = unpack_vector(doc.get(vec_field(model)))
+    normalize = match_mode != "distance"
+    if raw is None or (full_text and normalize and legacy_field(model, match_mode, True) in doc):
+        # Migrated rows keep their pre-adjusted unit(full) - unit(neg) list until the next reload
+        return unpack_vector(doc.get(legacy_field(model, match_mode, full_text)))
+
+    norms = doc.get(norms_field(model)) or {}
+    if not full_text:
+        return _unit(raw, norms.get("short")) if normalize else raw
+
+    full = unpack_vector(doc.get(vec_field(model, "full")))
+    full, full_norm = (raw, norms.get("short")) if full is None else (full, norms.get("full"))
+    neg = unpack_vector(doc.get(vec_field(model, "neg")))
+    if normalize:
+        full = _unit(full, full_norm)
+        neg = _unit(neg, norms.get("neg")) if neg is not None else None
+    if neg is not None and neg.shape == full.shape:
+        return full - neg
+    return full
+
+# ─── Migration from Triple Float Lists ───────────────────────────
+def legacy_models(doc):
+    return sorted(
+        key[len("embedding_raw_"):] for key in doc
+        if key.startswith("embedding_raw_") and not key.endswith("_full")
+    )
+
+def migrate_collection(collection, batch_size=500):
+    """Rewrite legacy embedding_{raw,cosine,dot}_* lists as compact Binary fields.
+
+    Legacy full-text vectors were stored already adjusted by the exclusion note, so
+    they migrate as vec_{model}_full without a separate vec_{model}_neg. That matches
+    distance (full - neg), but cosine / dotProduct used unit(full) - unit(neg), which
+    cannot be rebuilt from the difference, so their _full lists are kept as they are.
+    Reload the collection for a fully compact layout.
+    """
+    ops, migrated = [], 0
+    for doc in collection.find({}):
+        models = legacy_models(doc)
+        if not models:
+            continue
+        fields = {}
+        legacy = [k for k in doc if k.startswith("embedding_") and not (
+            k.endswith("_full") and k.startswith(("embedding_cosine_", "embedding_dot_")))]
+        for model in models:
+            raw_full = doc.get(f"embedding_raw_{model}_full")
+            fields.update(compact_fields(model, doc.get(f"embedding_raw_{model}"), raw_full))
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields, "$unset": {k: "" for k in legacy}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    return migrated
@@ -1,23 +1,40 @@
 # File: web_ui.py
 
-from generative_mapper import recommend_best_match
 import streamlit as st
-import os
-import yaml
-from dotenv import load_dotenv
-from pymongo import MongoClient
-from embedding_utils import get_embedding
-from mapper import find_best_matches
-
-# ─── Environment + Config ───────────────────────────────
-load_dotenv()
-with open("config.yaml") as f:
-    config = yaml.safe_load(f)
-
-mongo_uri = os.getenv("MONGO_URI", config.get("mongo_uri"))
-client = MongoClient(mongo_uri)
-db = client["industry_mapping"]
-isic_col = db[config["collections"]["isic"]]
+import time
+from registry import get_config
+from embedding_utils import fetch_raw_embedding, normalize_vector
+from mapper import find_best_matches, find_hierarchical_matches, get_base_index, base_fingerprint
+from metrics import METRICS, format_spans
+
+# ─── Environment + Config (process-wide, shared across reruns and sessions) ─
+config = get_config()
+
+class EmbeddingUnavailable(RuntimeError):
+    pass
+
+# ─── Cached Embeddings, Index and Matches ───────────────
+@st.cache_resource(show_spinner="📦 Loading ISIC index...")
+def warm_isic_index(model, match_mode, full_text):
+    # The mapper keeps the index resident and re-checks its fingerprint; this loads it once up front
+    return get_base_index(model, match_mode, full_text)
+
+@st.cache_data(max_entries=2048, show_spinner=False)
+def embed_query(text, model, match_mode):
+    # Raising keeps a failed call out of the cache, so the title is embedded again once Ollama is back
+    raw = fetch_raw_embedding(text, model)
+    if not raw:
+        raise EmbeddingUnavailable(f"No embedding returned by {model}")
+    return normalize_vector(raw, match_mode)
+
+@st.cache_data(max_entries=2048, show_spinner=False)
+def cached_matches(vec, text, k, match_mode, model, full_text, isic_level, section, strategy, beam, retrieval, fingerprint):
+    # `fingerprint` keys results to the ISIC collection version, so reloads never serve stale matches
+    if strategy == "Flat":
+        return find_best_matches(list(vec) if vec is not None else None, k=k, match_mode=match_mode, model=model,
+                                 full_text=full_text, isic_level=isic_level, section=section, text=text, retrieval=retrieval)
+    return find_hierarchical_matches(list(vec), k=k, match_mode=match_mode, model=model, full_text=full_text,
+                                     isic_level=isic_level, section=section, beam=beam)
 
 # ─── Streamlit UI Settings ──────────────────────────────
 st.set_page_config(page_title="ESIC to ISIC Mapper", layout="centered")
@@ -66,7 +83,26 @@ selected_section = st.sidebar.selectbox(
     index=0
 )
 
+search_strategy = st.sidebar.selectbox(
+    "Search Strategy",
+    options=["Flat", "Hierarchical (section → division → group)"],
+    index=0
+)
+retrieval = st.sidebar.selectbox(
+    "Retrieval",
+    options=["dense", "lexical", "rerank", "fusion"],
+    format_func={
+        "dense": "Dense (embeddings)",
+        "lexical": "Lexical TF-IDF (no embedding service)",
+        "rerank": "Lexical shortlist → dense re-rank",
+        "fusion": "Weighted dense + lexical fusion",
+    }.get,
+    index=0
+) if search_strategy == "Flat" else "dense"
+beam_width = st.sidebar.slider("🌳 Beam Width", min_value=1, max_value=10, value=config["search"].get("hierarchy", {}).get("beam", 3)) if search_strategy != "Flat" else None
+
 top_k = st.sidebar.slider("🔢 Number of Matches", min_value=1, max_value=25, value=config["search"].get("k_top", 3))
+show_timings = st.sidebar.checkbox("⏱️ Show timing breakdown", value=False)
 
 # ─── Main Input ─────────────────────────────────────────
 title_input = st.text_input("📝 Enter ESIC Title of Category:")
@@ -80,34 +116,64 @@ if "esic_vec" not in st.session_state:
     st.session_state.esic_vec = None
 if "ready_for_reasoning" not in st.session_state:
     st.session_state.ready_for_reasoning = False
+if "query" not in st.session_state:
+    st.session_state.query = None
+if "match_key" not in st.session_state:
+    st.session_state.match_key = None
 
 # ── Button: Vector Search ──────────────────────────────
 if st.button("Find Matches"):
     if not title_input.strip():
         st.warning("Please enter a valid title of category.")
+        st.session_state.query = None
     else:
-        with st.spinner("🔄 Generating embedding and finding matches..."):
-            st.session_state.esic_vec = get_embedding(
-                text=title_input,
-                model=selected_model,
-                normalize_mode=similarity_mode
-            )
-            st.session_state.matches = find_best_matches(
-                st.session_state.esic_vec,
-                k=top_k,
-                match_mode=similarity_mode,
-                model=selected_model,
-                full_text=full_text_mode == "Description only with notes",
-                isic_level= selected_level,
-                section=selected_section
-            )
+        st.session_state.query = title_input
+
+# Once a title has been searched, every rerun (e.g. a filter change) re-serves it from the caches
+if st.session_state.query:
+    full_text = full_text_mode == "Description only with notes"
+    # Stages timed on this thread (index load, fingerprint check, embedding, scoring, Mongo commands)
+    with st.spinner("🔄 Generating embedding and finding matches..."), METRICS.capture() as spans:
+        warm_isic_index(selected_model, similarity_mode, full_text)
+
+        started = time.perf_counter()
+        # Lexical retrieval needs no embedding call, so it keeps working when Ollama is down
+        try:
+            vec = embed_query(st.session_state.query, selected_model, similarity_mode) if retrieval != "lexical" else None
+        except EmbeddingUnavailable as embed_error:
+            st.error(f"❌ {embed_error}; is the embedding service running? Lexical retrieval works without it.")
+            st.session_state.matches = []
+            st.stop()
+        embed_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        st.session_state.esic_vec = vec
+        st.session_state.matches = cached_matches(
+            tuple(vec) if vec is not None else None,
+            st.session_state.query, top_k, similarity_mode, selected_model, full_text,
+            selected_level, selected_section, search_strategy, beam_width, retrieval,
+            # Held by the resident index and re-checked every snapshot.check_interval, not per rerun
+            base_fingerprint(selected_model, similarity_mode, full_text),
+        )
+        search_ms = (time.perf_counter() - started) * 1000
+
+    match_key = (st.session_state.query, top_k, similarity_mode, selected_model, full_text,
+                 selected_level, selected_section, search_strategy, beam_width, retrieval)
+    if match_key != st.session_state.match_key:
+        st.session_state.match_key = match_key
         st.session_state.recommendation = None
         st.session_state.ready_for_reasoning = False
+    st.caption(f"⏱️ {embed_ms + search_ms:.1f} ms — embedding {embed_ms:.1f} ms · search {search_ms:.1f} ms")
+    if show_timings:
+        # Stages missing from the list were served from the Streamlit caches
+        with st.expander("⏱️ Timing breakdown", expanded=True):
+            rows = [{"stage": stage, "ms": round(ms, 2)} for stage, ms in format_spans(spans)]
+            st.table(rows or [{"stage": "all stages served from cache", "ms": 0.0}])
 
 
 # ── Display Match Results First ────────────────────────
 if st.session_state.matches:
-    st.success(f"Top `{top_k}` ISIC matches for `{title_input}` using `{selected_model}` AI embedding model.")
+    st.success(f"Top `{top_k}` ISIC matches for `{st.session_state.query}` using `{selected_model}` AI embedding model.")
 
     for i, match in enumerate(st.session_state.matches, start=1):
         color = (
@@ -120,29 +186,36 @@ if st.session_state.matches:
             st.write(f"**Section:** `{match['section_label']}`")
             st.write(f"**Division:** `{match['division_label']}`")
             st.write(f"**Group:** `{match['group_label']}`")
+            if match.get("path"):
+                st.write("**Path:** " + " → ".join(f"`{p['full_code']}` ({p['score']})" for p in match["path"]))
             st.progress(match["score"])
 
 # ── Trigger Reasoning Separately ───────────────────────
+streamed_now = False
 if st.session_state.matches and selected_gen_model:
     if st.button("💡 Generate AI Reasoning"):
         st.session_state.recommendation = None
         st.session_state.ready_for_reasoning = True
 
     if st.session_state.ready_for_reasoning and st.session_state.recommendation is None:
-        with st.spinner("🧠 AI reasoning in progress..."):
-            try:
-                st.session_state.recommendation = recommend_best_match(
-                    esic_title=title_input,
-                    matches=st.session_state.matches,
-                    embedding_model=selected_model,
-                    gen_model=selected_gen_model,
-                    similarity_mode=similarity_mode,
-                    top_k=top_k
-                )
-            except Exception as gen_error:
-                st.session_state.recommendation = f"⚠️ Recommendation failed: {gen_error}"
+        # Tokens render as they arrive; repeated requests are replayed from the response cache
+        st.subheader("🧠 Suggested Best Match by AI Reasoning")
+        try:
+            from generative_mapper import stream_best_match    # only loaded once reasoning is requested
+            st.session_state.recommendation = st.write_stream(stream_best_match(
+                esic_title=st.session_state.query,
+                matches=st.session_state.matches,
+                embedding_model=selected_model,
+                gen_model=selected_gen_model,
+                similarity_mode=similarity_mode,
+                top_k=top_k
+            )) or "⚠️ Empty generate output."
+        except Exception as gen_error:
+            st.session_state.recommendation = f"⚠️ Recommendation failed: {gen_error}"
+            st.info(st.session_state.recommendation)
+        streamed_now = True
 
 # ── Show Recommendation Above Matches ───────────────────
-if st.session_state.recommendation:
+if st.session_state.recommendation and not streamed_now:
     st.subheader("🧠 Suggested Best Match by AI Reasoning")
-    st.info(st.session_state.recommendation)
\ No newline at end of file
+    st.info(st.session_state.recommendation)